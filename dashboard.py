@@ -12,6 +12,9 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 
 from noc.simulator import Simulator
+from metrics.energy import EnergyModel
+from noc.workload import RequestResponseWorkload
+from noc.watchdog import NetworkStallError
 
 def create_plot(x_data, y_data, config, title_extra, xlabel):
     plt.figure(figsize=(10, 6))
@@ -54,6 +57,9 @@ app.layout = html.Div([
                 options=[
                     {'label': '2D Mesh', 'value': 'mesh'},
                     {'label': '2D Torus', 'value': 'torus'},
+                    {'label': 'Concentrated Mesh', 'value': 'cmesh'},
+                    {'label': 'Express Mesh', 'value': 'express_mesh'},
+                    {'label': 'Flattened Butterfly', 'value': 'flattened_butterfly'},
                 ], value='mesh'
             )
         ]),
@@ -72,13 +78,26 @@ app.layout = html.Div([
             {'label': 'Uniform Random', 'value': 'uniform_random'},
             {'label': 'Transpose', 'value': 'transpose'},
             {'label': 'Hotspot', 'value': 'hotspot'},
+            {'label': 'Bit Complement', 'value': 'bit_complement'},
+            {'label': 'Bit Reversal', 'value': 'bit_reversal'},
+            {'label': 'Shuffle', 'value': 'shuffle'},
+            {'label': 'Tornado', 'value': 'tornado'},
+            {'label': 'Neighbor', 'value': 'neighbor'},
+            {'label': 'Grouped (Tensor Parallel)', 'value': 'grouped'},
+            {'label': 'Pipeline', 'value': 'pipeline'},
             {'label': 'All-Reduce Workload', 'value': 'all_reduce'},
+            {'label': 'Request/Response (Closed Loop)', 'value': 'request_response'},
         ], value='uniform_random'),
 
         html.Div(id='all-reduce-options', style={'display': 'none'}, children=[
             html.H4("All-Reduce Workload Settings"),
             html.Label("Packet Size (Flits per chunk):"),
             dcc.Input(id='ar-chunk-size-input', type='number', value=4, min=1),
+            html.Label("Algorithm:"),
+            dcc.Dropdown(id='ar-algorithm-dropdown', options=[
+                {'label': 'Ring', 'value': 'ring'},
+                {'label': 'In-Network Reduction (Fat-Tree)', 'value': 'in_network'},
+            ], value='ring'),
             html.P("Experiment sweeps over the total number of data chunks."),
         ]),
 
@@ -149,9 +168,10 @@ def toggle_sim_cycles_visibility(traffic_pattern):
      State('routing-algo-dropdown', 'value'),
      State('num-vcs-input', 'value'),
      State('sim-cycles-input', 'value'),
-     State('ar-chunk-size-input', 'value')]
+     State('ar-chunk-size-input', 'value'),
+     State('ar-algorithm-dropdown', 'value')]
 )
-def run_simulation_sweep(n_clicks, arch, p_topo, s_topo, pattern, routing, vcs, cycles, ar_chunk):
+def run_simulation_sweep(n_clicks, arch, p_topo, s_topo, pattern, routing, vcs, cycles, ar_chunk, ar_algorithm):
     if n_clicks == 0:
         return "Click 'Run Experiment Sweep' to start.", ""
 
@@ -174,8 +194,8 @@ def run_simulation_sweep(n_clicks, arch, p_topo, s_topo, pattern, routing, vcs,
         random.seed(seed)
         print(f"--- Running experiment with Random Seed: {seed} ---")
 
-    latencies = []
-    
+    latencies, energy_reports = [], []
+
     if pattern == 'all_reduce':
         sweep_values = np.arange(4, 33, 4)
         xlabel = "Number of Data Chunks per Node for All-Reduce"
@@ -185,7 +205,10 @@ def run_simulation_sweep(n_clicks, arch, p_topo, s_topo, pattern, routing, vcs,
             if 'workload' not in sim_config: sim_config['workload'] = {}
             sim_config['workload']['all_reduce_data_size'] = int(num_chunks)
             sim_config['workload']['all_reduce_chunk_size_flits'] = ar_chunk
-            latencies.append(run_single_sim(sim_config))
+            sim_config['workload']['all_reduce_algorithm'] = ar_algorithm
+            latency, energy = run_single_sim(sim_config)
+            latencies.append(latency)
+            energy_reports.append(energy)
     else:
         sweep_values = np.arange(0.01, 0.16, 0.02)
         xlabel = "Injection Rate (packets/node/cycle)"
@@ -193,27 +216,43 @@ def run_simulation_sweep(n_clicks, arch, p_topo, s_topo, pattern, routing, vcs,
         for rate in sweep_values:
             sim_config = config.copy()
             sim_config['injection_rate'] = rate
-            latencies.append(run_single_sim(sim_config))
+            latency, energy = run_single_sim(sim_config)
+            latencies.append(latency)
+            energy_reports.append(energy)
 
-    summary_text = f"Experiment Complete. Architecture: {arch.replace('_', ' ').title()}."
+    summary_text = [html.P(f"Experiment Complete. Architecture: {arch.replace('_', ' ').title()}.")]
+    for value, energy in zip(sweep_values, energy_reports):
+        if energy and 'failed' in energy:
+            summary_text.append(html.P(f"{value:.2f}: FAILED ({energy['failed']} detected by the watchdog)"))
+        elif energy:
+            summary_text.append(html.P(f"{value:.2f}: {energy['avg_power_mw']:.2f} mW average power, "
+                                       f"{energy['energy_per_packet_pj']:.1f} pJ/packet, "
+                                       f"{energy['packets_per_nj']:.3f} packets/nJ"))
     graph_src = create_plot(sweep_values, latencies, config, title_extra, xlabel)
     
     return summary_text, graph_src
 
-def run_single_sim(sim_config: dict) -> float:
+def run_single_sim(sim_config: dict) -> tuple[float, dict | None]:
     try:
         with warnings.catch_warnings(record=True) as w:
             warnings.simplefilter("always")
             simulator = Simulator(config=sim_config)
             simulator.run(num_cycles=sim_config['simulation_cycles'])
             avg_latency = simulator.tracker.calculate_average_latency()
+            if isinstance(simulator.workload, RequestResponseWorkload):
+                avg_latency = simulator.workload.average_round_trip()
+            energy = EnergyModel(sim_config).report(simulator, simulator.tracker.packets_delivered)
             if w:
                 for warning_message in w:
                     print(f"Warning: {warning_message.message}")
-            return avg_latency
+            return avg_latency, energy
+    except NetworkStallError as e:
+        # Failed points are left out of the plot (NaN) and listed in the summary.
+        print(f"Simulation aborted by the watchdog:\n{e}")
+        return float('nan'), {'failed': e.report['kind']}
     except Exception as e:
         print(f"An error occurred during simulation: {e}")
-        return 0.0
+        return 0.0, None
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
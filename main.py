@@ -1,5 +1,9 @@
 import yaml
 from noc.simulator import Simulator
+from metrics.energy import EnergyModel
+from noc.workload import AllReduceWorkload, RequestResponseWorkload
+from noc.collective import collective_stats
+from noc.watchdog import NetworkStallError
 
 
 def main():
@@ -16,13 +20,17 @@ def main():
 
     simulator = Simulator(config=config)
 
-    simulator.run(num_cycles=num_cycles)
+    try:
+        simulator.run(num_cycles=num_cycles)
+    except NetworkStallError as e:
+        print(f"\nSimulation aborted by the watchdog:\n{e}")
+        raise SystemExit(1)
     
     print("\n Simulation Metrics Summary")
     tracker = simulator.tracker
     
     total_packets_sent = sum(node.packets_sent for node in simulator.nodes)
-    total_packets_received = len(tracker.packet_latencies)
+    total_packets_received = tracker.packets_delivered
     avg_latency = tracker.calculate_average_latency()
     throughput = tracker.calculate_throughput(num_cycles, num_gpus)
 
@@ -30,6 +38,40 @@ def main():
     print(f"Total Packets Received: {total_packets_received}")
     print(f"Average Packet Latency: {avg_latency:.2f} cycles")
     print(f"Network Throughput:     {throughput:.4f} packets/cycle")
+    if simulator.steering:
+        primary, secondary = simulator.steering.packets_steered
+        print(f"Steered Packets:        {primary} primary / {secondary} secondary")
+
+    if isinstance(simulator.workload, RequestResponseWorkload):
+        closed_loop = simulator.workload.report(simulator.current_cycle)
+        print(f"Requests Issued:        {closed_loop['requests_issued']} ({closed_loop['requests_blocked']} blocked by MSHR cap)")
+        print(f"Responses Received:     {closed_loop['responses_received']}")
+        print(f"Round-Trip Latency:     {closed_loop['avg_round_trip']:.2f} cycles")
+        print(f"Read Bandwidth:         {closed_loop['bandwidth_flits_per_cycle']:.4f} flits/cycle "
+              f"({closed_loop['bandwidth_bytes_per_cycle_per_node']:.2f} B/cycle/node)")
+
+    if isinstance(simulator.workload, AllReduceWorkload) and simulator.workload.in_network:
+        traffic = simulator.workload.traffic_report()
+        collectives = collective_stats(simulator.networks)
+        print(f"GPU Flits Sent:         {traffic['host_flits_sent']} (ring all-reduce: {traffic['ring_flits']})")
+        print(f"Flits Merged:           {collectives['flits_merged']}")
+        print(f"Flits Replicated:       {collectives['flits_replicated']}")
+
+    energy = EnergyModel(config).report(simulator, total_packets_received)
+    print(f"Total Energy:           {energy['energy_pj'] / 1000:.2f} nJ")
+    print(f"Average Power:          {energy['avg_power_mw']:.2f} mW")
+    print(f"Energy per Packet:      {energy['energy_per_packet_pj']:.2f} pJ")
+    print(f"Perf per Watt:          {energy['packets_per_nj']:.4f} packets/nJ")
+
+    records = tracker.records
+    if records is not None:
+        print(f"Recorded Packets:       {len(records)}")
+        print(f"Avg Injection Wait:     {records.queueing_delays().mean() if len(records) else 0.0:.2f} cycles")
+        for network, latency in records.latency_by_network().items():
+            print(f"{f'Latency ({network}):':<24}{latency:.2f} cycles")
+        for distance, latency in sorted(records.latency_by_distance(simulator.primary_network).items()):
+            print(f"{f'Latency at {distance} hops:':<24}{latency:.2f} cycles")
+        records.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+DEFAULT_ENERGY_PJ = {
+    'buffer_write': 1.0,
+    'buffer_read': 0.8,
+    'route_computation': 0.2,
+    'vc_allocation': 0.15,
+    'switch_allocation': 0.2,
+    'crossbar_traversal': 1.5,
+    'link_traversal': 3.0,
+    'idle_cycle': 0.05,
+}
+
+
+def collect_activity(network) -> dict[str, int]:
+    counts = dict.fromkeys(DEFAULT_ENERGY_PJ, 0)
+    for router in network.routers.values():
+        counts['buffer_write'] += router.buffer_writes
+        counts['buffer_read'] += router.buffer_reads
+        counts['route_computation'] += router.route_computations
+        counts['vc_allocation'] += router.vc_grants
+        counts['switch_allocation'] += router.switch_grants
+        counts['crossbar_traversal'] += router.switch_grants
+        counts['link_traversal'] += sum(router.link_traversals)
+        counts['idle_cycle'] += router.idle_cycles
+    return counts
+
+
+class EnergyModel:
+    """Turns router/link activity counts into energy (pJ) and average power (mW) using the `energy` config table."""
+
+    def __init__(self, config: dict):
+        energy_config = config.get('energy', {})
+        self.clock_ghz = energy_config.get('clock_ghz', 1.0)
+        self.per_event_pj = {**DEFAULT_ENERGY_PJ, **energy_config.get('per_event_pj', {})}
+        # Optional per-network overrides, e.g. longer fat-tree links: {secondary: {link_traversal: 6.0}}.
+        self.network_overrides = energy_config.get('network_overrides', {})
+
+    def network_energy_pj(self, counts: dict[str, int], role: str) -> float:
+        table = {**self.per_event_pj, **self.network_overrides.get(role, {})}
+        return sum(count * table[event] for event, count in counts.items())
+
+    def report(self, simulator, packets_received: int) -> dict:
+        cycles = max(simulator.current_cycle, 1)
+        networks = {'primary': simulator.primary_network, 'secondary': simulator.secondary_network}
+        report = {'networks': {}}
+        total_pj = 0.0
+        for role, network in networks.items():
+            if network is None: continue
+            counts = collect_activity(network)
+            energy_pj = self.network_energy_pj(counts, role)
+            report['networks'][role] = {'activity': counts, 'energy_pj': energy_pj}
+            total_pj += energy_pj
+        runtime_ns = cycles / self.clock_ghz
+        report['energy_pj'] = total_pj
+        report['avg_power_mw'] = total_pj / runtime_ns
+        report['energy_per_packet_pj'] = total_pj / packets_received if packets_received else 0.0
+        # Packets per nanojoule is throughput per watt scaled to (packets/s)/W / 1e9.
+        report['packets_per_nj'] = packets_received / (total_pj / 1000) if total_pj else 0.0
+        return report
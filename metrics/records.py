@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# One preallocated array per column; rows are appended when a packet's tail flit is ejected.
+RECORD_COLUMNS = {
+    'packet_id': np.int64,
+    'src': np.int32,
+    'dst': np.int32,
+    'size': np.int32,
+    'network': np.int8,
+    'create': np.int64,
+    'inject': np.int64,
+    'eject': np.int64,
+    'hops': np.int32,
+}
+NETWORK_NAMES = ('primary', 'secondary')
+
+
+class PacketRecordStore:
+    """Per-packet records in chunked NumPy columns; full chunks beyond `max_memory_chunks` spill to memory-mapped files."""
+
+    def __init__(self, chunk_size: int = 65536, max_memory_chunks: int = 16, spill_dir: str | None = None):
+        self.chunk_size = chunk_size
+        self.max_memory_chunks = max(0, max_memory_chunks)
+        # Each store spills into its own fresh directory (under `spill_dir` if given), removed by close().
+        self.spill_parent = spill_dir
+        self.spill_dir: str | None = None
+        self._chunks: list[dict[str, np.ndarray]] = []
+        self._current = self._new_chunk()
+        self._fill = 0
+        self._spilled = 0
+
+    def _new_chunk(self) -> dict[str, np.ndarray]:
+        return {name: np.empty(self.chunk_size, dtype) for name, dtype in RECORD_COLUMNS.items()}
+
+    def _spill_path(self, name: str) -> str:
+        if self.spill_dir is None:
+            if self.spill_parent is not None: os.makedirs(self.spill_parent, exist_ok=True)
+            self.spill_dir = tempfile.mkdtemp(prefix='noc_records_', dir=self.spill_parent)
+        return os.path.join(self.spill_dir, f'{name}.bin')
+
+    def append(self, packet_id: int, src: int, dst: int, size: int, network: int,
+               create: int, inject: int, eject: int, hops: int):
+        chunk, i = self._current, self._fill
+        chunk['packet_id'][i] = packet_id
+        chunk['src'][i] = src
+        chunk['dst'][i] = dst
+        chunk['size'][i] = size
+        chunk['network'][i] = network
+        chunk['create'][i] = create
+        chunk['inject'][i] = inject
+        chunk['eject'][i] = eject
+        chunk['hops'][i] = hops
+        self._fill = i + 1
+        if self._fill == self.chunk_size: self._seal()
+
+    def _seal(self):
+        self._chunks.append(self._current)
+        self._fill = 0
+        if len(self._chunks) <= self.max_memory_chunks:
+            self._current = self._new_chunk()
+            return
+        # Spill the oldest chunk and reuse its arrays for the next one.
+        oldest = self._chunks.pop(0)
+        for name, values in oldest.items():
+            with open(self._spill_path(name), 'ab') as f: values.tofile(f)
+        self._spilled += self.chunk_size
+        self._current = oldest
+
+    def __len__(self) -> int:
+        return self._spilled + len(self._chunks) * self.chunk_size + self._fill
+
+    def column(self, name: str) -> np.ndarray:
+        dtype = RECORD_COLUMNS[name]
+        parts = []
+        if self._spilled:
+            parts.append(np.memmap(self._spill_path(name), dtype=dtype, mode='r', shape=(self._spilled,)))
+        parts.extend(chunk[name] for chunk in self._chunks)
+        parts.append(self._current[name][:self._fill])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def latencies(self) -> np.ndarray:
+        return self.column('eject') - self.column('create')
+
+    def queueing_delays(self) -> np.ndarray:
+        return self.column('inject') - self.column('create')
+
+    def latency_by_distance(self, network=None) -> dict[int, float]:
+        """Mean latency per source-destination distance: `network.hop_distance` if given, else the hops travelled."""
+        if network is None: return _grouped_mean(self.column('hops'), self.latencies())
+        # hop_distance is evaluated once per distinct (src, dst) pair, not per packet.
+        src, dst = self.column('src').astype(np.int64), self.column('dst')
+        width = int(dst.max(initial=0)) + 1
+        pairs, inverse = np.unique(src * width + dst, return_inverse=True)
+        distances = np.array([network.hop_distance(int(p // width), int(p % width)) for p in pairs], dtype=np.int32)
+        return _grouped_mean(distances[inverse], self.latencies())
+
+    def latency_by_network(self) -> dict[str, float]:
+        means = _grouped_mean(self.column('network'), self.latencies())
+        return {NETWORK_NAMES[net]: latency for net, latency in means.items()}
+
+    def latency_over_time(self, window: int = 1000) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (window start cycles, mean latency of packets ejected in each window); empty windows are NaN."""
+        eject = self.column('eject')
+        if not len(eject): return np.empty(0, np.int64), np.empty(0)
+        bins = eject // window
+        counts = np.bincount(bins)
+        sums = np.bincount(bins, weights=self.latencies())
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.arange(len(counts)) * window, sums / counts
+
+    def save(self, path: str):
+        np.savez(path, **{name: self.column(name) for name in RECORD_COLUMNS})
+
+    def close(self):
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+        self._spilled = 0
+
+
+def _grouped_mean(keys: np.ndarray, values: np.ndarray) -> dict[int, float]:
+    if not len(keys): return {}
+    keys = keys.astype(np.int64)
+    counts = np.bincount(keys)
+    sums = np.bincount(keys, weights=values)
+    return {int(k): float(sums[k] / counts[k]) for k in np.nonzero(counts)[0]}
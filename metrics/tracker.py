@@ -1,25 +1,58 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from metrics.records import PacketRecordStore
+
+
 class MetricsTracker:
-    def __init__(self):
+    def __init__(self, records: 'PacketRecordStore | None' = None):
         self.packet_creation_times: dict[int, int] = {}
+        # Per-packet latencies are kept here only without a record store, which already holds them in columns.
         self.packet_latencies: list[int] = []
+        self.packets_delivered = 0
+        self.latency_sum = 0
+        # Optional per-packet log; only packets in flight keep a row here until their tail flit is ejected.
+        self.records = records
+        self._pending_records: dict[int, list[int]] = {}
 
-    def record_packet_creation(self, packet_id: int, creation_time: int): 
+    def record_packet_creation(self, packet_id: int, creation_time: int, src: int = -1, dst: int = -1,
+                               size: int = 0, network: int = 0):
         self.packet_creation_times[packet_id] = creation_time
+        if self.records is not None:
+            self._pending_records[packet_id] = [src, dst, size, network, creation_time, -1]
+
+    def record_packet_injection(self, packet_id: int, injection_time: int):
+        pending = self._pending_records.get(packet_id)
+        if pending is not None: pending[5] = injection_time
 
-    def record_packet_receipt(self, packet_id: int, receipt_time: int):
+    def record_packet_receipt(self, packet_id: int, receipt_time: int, hops: int = 0):
         if packet_id in self.packet_creation_times:
             creation_time = self.packet_creation_times[packet_id]
             latency = receipt_time - creation_time
-            self.packet_latencies.append(latency)
+            self.packets_delivered += 1
+            self.latency_sum += latency
+            if self.records is None: self.packet_latencies.append(latency)
             del self.packet_creation_times[packet_id]
+        if self.records is not None:
+            pending = self._pending_records.pop(packet_id, None)
+            if pending is not None: self.records.append(packet_id, *pending, receipt_time, hops)
 
     def calculate_average_latency(self) -> float:
-        if not self.packet_latencies:
+        if not self.packets_delivered:
             return 0.0
-        return sum(self.packet_latencies) / len(self.packet_latencies)
-    
+        return self.latency_sum / self.packets_delivered
+
     def calculate_throughput(self, num_cycles: int, num_nodes: int) -> float:
-        total_flits_received = sum(self.packet_latencies) # A proxy for flits
         if num_cycles == 0 or num_nodes == 0:
             return 0.0
-        return len(self.packet_latencies) / num_cycles
\ No newline at end of file
+        return self.packets_delivered / num_cycles
+
+
+def make_record_store(config: dict) -> 'PacketRecordStore | None':
+    # NumPy is only needed when packet records are enabled.
+    records_config = config.get('packet_records', {})
+    if not records_config.get('enabled', False): return None
+    from metrics.records import PacketRecordStore
+    return PacketRecordStore(chunk_size=records_config.get('chunk_size', 65536),
+                             max_memory_chunks=records_config.get('max_memory_chunks', 16),
+                             spill_dir=records_config.get('spill_dir'))
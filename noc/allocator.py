@@ -0,0 +1,157 @@
+class RoundRobinArbiter:
+    """Bitmask round-robin arbiter: the lowest requester at or above the pointer wins."""
+    __slots__ = ('pointer',)
+
+    def __init__(self):
+        self.pointer = 0
+
+    def pick(self, requests: int) -> int:
+        upper = requests >> self.pointer << self.pointer
+        if upper: requests = upper
+        return (requests & -requests).bit_length() - 1
+
+    def advance(self, winner: int):
+        self.pointer = winner + 1
+
+
+class SeparableInputFirstAllocator:
+    """Each input picks one requested output, then each output picks one of the inputs that chose it."""
+
+    def __init__(self, num_inputs: int, num_outputs: int, iterations: int = 1):
+        self.input_arbiters = [RoundRobinArbiter() for _ in range(num_inputs)]
+        self.output_arbiters = [RoundRobinArbiter() for _ in range(num_outputs)]
+        self._out_requests = [0] * num_outputs
+
+    def allocate(self, input_mask: int, requests: list[int]) -> list[tuple[int, int]]:
+        if not input_mask & (input_mask - 1): return _allocate_single(self, input_mask, requests)
+        out_requests, out_mask = self._out_requests, 0
+        while input_mask:
+            low = input_mask & -input_mask
+            input_mask ^= low
+            i = low.bit_length() - 1
+            o = self.input_arbiters[i].pick(requests[i])
+            out_requests[o] |= low
+            out_mask |= 1 << o
+        grants = []
+        while out_mask:
+            low = out_mask & -out_mask
+            out_mask ^= low
+            o = low.bit_length() - 1
+            i = self.output_arbiters[o].pick(out_requests[o])
+            out_requests[o] = 0
+            self.output_arbiters[o].advance(i)
+            self.input_arbiters[i].advance(o)
+            grants.append((i, o))
+        return grants
+
+
+class SeparableOutputFirstAllocator:
+    """Each output grants one requesting input, then each input accepts one of its grants."""
+
+    def __init__(self, num_inputs: int, num_outputs: int, iterations: int = 1):
+        self.input_arbiters = [RoundRobinArbiter() for _ in range(num_inputs)]
+        self.output_arbiters = [RoundRobinArbiter() for _ in range(num_outputs)]
+        self._out_requests = [0] * num_outputs
+        self._in_grants = [0] * num_inputs
+
+    def allocate(self, input_mask: int, requests: list[int]) -> list[tuple[int, int]]:
+        if not input_mask & (input_mask - 1): return _allocate_single(self, input_mask, requests)
+        out_requests, in_grants = self._out_requests, self._in_grants
+        out_mask = _transpose(input_mask, requests, -1, out_requests)
+        grant_mask = 0
+        while out_mask:
+            low = out_mask & -out_mask
+            out_mask ^= low
+            o = low.bit_length() - 1
+            i = self.output_arbiters[o].pick(out_requests[o])
+            out_requests[o] = 0
+            in_grants[i] |= low
+            grant_mask |= 1 << i
+        grants = []
+        while grant_mask:
+            low = grant_mask & -grant_mask
+            grant_mask ^= low
+            i = low.bit_length() - 1
+            o = self.input_arbiters[i].pick(in_grants[i])
+            in_grants[i] = 0
+            self.output_arbiters[o].advance(i)
+            self.input_arbiters[i].advance(o)
+            grants.append((i, o))
+        return grants
+
+
+class ISLIPAllocator:
+    """Multi-iteration iSLIP; pointers only move on grants accepted in the first iteration."""
+
+    def __init__(self, num_inputs: int, num_outputs: int, iterations: int = 2):
+        self.iterations = max(1, iterations)
+        self.input_arbiters = [RoundRobinArbiter() for _ in range(num_inputs)]
+        self.output_arbiters = [RoundRobinArbiter() for _ in range(num_outputs)]
+        self._out_requests = [0] * num_outputs
+        self._in_grants = [0] * num_inputs
+
+    def allocate(self, input_mask: int, requests: list[int]) -> list[tuple[int, int]]:
+        if not input_mask & (input_mask - 1): return _allocate_single(self, input_mask, requests)
+        out_requests, in_grants = self._out_requests, self._in_grants
+        free_outputs = -1
+        grants = []
+        for iteration in range(self.iterations):
+            out_mask = _transpose(input_mask, requests, free_outputs, out_requests)
+            if not out_mask: break
+            grant_mask = 0
+            while out_mask:
+                low = out_mask & -out_mask
+                out_mask ^= low
+                o = low.bit_length() - 1
+                i = self.output_arbiters[o].pick(out_requests[o])
+                out_requests[o] = 0
+                in_grants[i] |= low
+                grant_mask |= 1 << i
+            while grant_mask:
+                low = grant_mask & -grant_mask
+                grant_mask ^= low
+                i = low.bit_length() - 1
+                o = self.input_arbiters[i].pick(in_grants[i])
+                in_grants[i] = 0
+                if iteration == 0:
+                    self.output_arbiters[o].advance(i)
+                    self.input_arbiters[i].advance(o)
+                input_mask &= ~low
+                free_outputs &= ~(1 << o)
+                grants.append((i, o))
+        return grants
+
+
+def _allocate_single(allocator, input_mask: int, requests: list[int]) -> list[tuple[int, int]]:
+    # With one requesting input every allocator reduces to the input arbiter's choice, with the same pointer updates.
+    i = input_mask.bit_length() - 1
+    o = allocator.input_arbiters[i].pick(requests[i])
+    allocator.input_arbiters[i].advance(o)
+    allocator.output_arbiters[o].advance(i)
+    return [(i, o)]
+
+
+def _transpose(input_mask: int, requests: list[int], output_filter: int, out_requests: list[int]) -> int:
+    out_mask = 0
+    while input_mask:
+        low = input_mask & -input_mask
+        input_mask ^= low
+        outputs = requests[low.bit_length() - 1] & output_filter
+        out_mask |= outputs
+        while outputs:
+            bit = outputs & -outputs
+            outputs ^= bit
+            out_requests[bit.bit_length() - 1] |= low
+    return out_mask
+
+
+ALLOCATORS = {
+    'input_first': SeparableInputFirstAllocator,
+    'output_first': SeparableOutputFirstAllocator,
+    'islip': ISLIPAllocator,
+}
+
+
+def make_allocator(name: str, num_inputs: int, num_outputs: int, iterations: int = 1):
+    if name not in ALLOCATORS: raise ValueError(f"Unknown allocator: {name}")
+    return ALLOCATORS[name](num_inputs, num_outputs, iterations)
@@ -0,0 +1,72 @@
+import collections
+from .packet import Flit, FlitType, PacketType, packet_id_counter
+
+COLLECTIVE_PACKET_TYPES = (PacketType.REDUCE, PacketType.MULTICAST)
+
+
+class CollectiveEngine:
+    """Reduction/multicast unit behind an extra internal port of a fat-tree switch.
+
+    REDUCE packets of one collective (transaction id) are summed until every child subtree has
+    contributed, then sent up the tree as one packet; the core turns the result into MULTICAST
+    copies, and each switch on the way down replicates them to its child subtrees.
+    """
+
+    def __init__(self, router, children: list[int]):
+        self.router = router
+        # One destination node per child subtree that holds GPUs; copies addressed to it reach that subtree.
+        self.children = children
+        self.queue: collections.deque[Flit] = collections.deque()
+        self.partial: dict[int, list[int]] = {}
+        self.reductions: dict[int, list] = {}
+        self.next_vc = 0
+        self.reduce_flits_in, self.reduce_flits_out = 0, 0
+        self.multicast_flits_in, self.multicast_flits_out = 0, 0
+
+    def receive(self, flit: Flit):
+        payloads = self.partial.setdefault(flit.packet_id, [])
+        payloads.append(flit.payload)
+        if flit.flit_type is not FlitType.TAIL and flit.flit_type is not FlitType.HEAD_TAIL: return
+        del self.partial[flit.packet_id]
+        collective_id = flit.transaction_id
+        if flit.packet_type is PacketType.MULTICAST:
+            self.multicast_flits_in += len(payloads)
+            for dest in self.children: self._emit(PacketType.MULTICAST, flit, dest, payloads)
+            return
+        self.reduce_flits_in += len(payloads)
+        state = self.reductions.get(collective_id)
+        if state is None: state = self.reductions[collective_id] = [0, [0] * len(payloads)]
+        state[0] += 1
+        total = state[1]
+        for i, value in enumerate(payloads): total[i] += value
+        if state[0] < len(self.children): return
+        del self.reductions[collective_id]
+        if self.router.type == 'core':
+            for dest in self.children: self._emit(PacketType.MULTICAST, flit, dest, total)
+        else:
+            self._emit(PacketType.REDUCE, flit, flit.dest_address, total)
+
+    def _emit(self, packet_type: PacketType, flit: Flit, dest: int, payloads: list[int]):
+        packet_id, vc = next(packet_id_counter), self.next_vc
+        self.next_vc = (vc + 1) % self.router.num_vcs
+        last = len(payloads) - 1
+        for i, value in enumerate(payloads):
+            if last == 0: flit_type = FlitType.HEAD_TAIL
+            else: flit_type = FlitType.HEAD if i == 0 else FlitType.TAIL if i == last else FlitType.BODY
+            self.queue.append(Flit(flit_type=flit_type, payload=value, packet_id=packet_id, vc_id=vc,
+                                   src_address=flit.src_address, dest_address=dest,
+                                   use_secondary_network=flit.use_secondary_network,
+                                   packet_type=packet_type, transaction_id=flit.transaction_id))
+        if packet_type is PacketType.REDUCE: self.reduce_flits_out += len(payloads)
+        else: self.multicast_flits_out += len(payloads)
+
+
+def collective_stats(networks) -> dict[str, int]:
+    stats = dict.fromkeys(('reduce_flits_in', 'reduce_flits_out', 'multicast_flits_in', 'multicast_flits_out'), 0)
+    for network in networks:
+        for engine in network.collective_engines:
+            for key in stats: stats[key] += getattr(engine, key)
+    # Flits absorbed by aggregation and flits created by replication inside the switches.
+    stats['flits_merged'] = stats['reduce_flits_in'] - stats['reduce_flits_out']
+    stats['flits_replicated'] = stats['multicast_flits_out'] - stats['multicast_flits_in']
+    return stats
@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class LinkConfig:
+    latency: int = 1
+    width_bits: int | None = None
+    num_vcs: int | None = None
+
+    @classmethod
+    def from_dict(cls, config: dict | None) -> 'LinkConfig':
+        config = config or {}
+        width_bits, num_vcs = config.get('width_bits'), config.get('num_vcs')
+        return cls(latency=int(config.get('latency', 1)),
+                   width_bits=None if width_bits is None else int(width_bits),
+                   num_vcs=None if num_vcs is None else int(num_vcs))
+
+
+@dataclass(frozen=True, slots=True)
+class ChipletConfig:
+    """Packages of chiplets of GPU meshes; all shapes are (width, height)."""
+    chiplet_mesh: tuple[int, int]
+    chiplets_per_package: tuple[int, int]
+    packages: tuple[int, int]
+    inter_chiplet_link: LinkConfig
+    inter_package_link: LinkConfig
+
+    @classmethod
+    def from_dict(cls, config: dict) -> 'ChipletConfig':
+        return cls(chiplet_mesh=tuple(config.get('chiplet_mesh', (4, 4))),
+                   chiplets_per_package=tuple(config.get('chiplets_per_package', (2, 2))),
+                   packages=tuple(config.get('packages', (1, 1))),
+                   inter_chiplet_link=LinkConfig.from_dict(config.get('inter_chiplet_link')),
+                   inter_package_link=LinkConfig.from_dict(config.get('inter_package_link')))
+
+
+@dataclass(frozen=True, slots=True)
+class SimConfig:
+    """Typed, immutable view of the fields the simulation hot path reads, compiled once from config.yaml."""
+    architecture: str
+    num_gpus: int
+    topology: str
+    secondary_topology: str | None
+    routing_algo: str
+    secondary_routing_algo: str | None
+    num_virtual_channels: int
+    router_buffer_size: int
+    vc_allocator: str
+    switch_allocator: str
+    allocator_iterations: int
+    fat_tree_k: int | None
+    concentration: int
+    express_interval: int
+    traffic_pattern: str
+    injection_rate: float
+    hotspot_nodes: tuple[int, ...]
+    hotspot_rate: float
+    flit_width_bits: int
+    chiplet: ChipletConfig
+    in_network_collectives: bool
+
+    @classmethod
+    def from_dict(cls, config: dict) -> 'SimConfig':
+        architecture = config.get('architecture', 'monolithic')
+        secondary_topology, secondary_routing_algo = None, None
+        if architecture == 'hybrid_electrical':
+            secondary_topology = config['hybrid_electrical_config']['secondary_topology']
+            secondary_routing_algo = config['hybrid_electrical_config'].get('secondary_routing_algo')
+        fat_tree_k = config.get('fat_tree_k')
+        in_network = config.get('workload', {}).get('all_reduce_algorithm', 'ring') == 'in_network'
+        return cls(
+            architecture=architecture,
+            num_gpus=int(config['num_gpus']),
+            topology=config.get('topology', 'mesh'),
+            secondary_topology=secondary_topology,
+            routing_algo=config.get('routing_algo') or 'deterministic',
+            secondary_routing_algo=secondary_routing_algo,
+            num_virtual_channels=int(config['num_virtual_channels']),
+            router_buffer_size=int(config.get('router_buffer_size', 8)),
+            vc_allocator=config.get('vc_allocator', 'input_first'),
+            switch_allocator=config.get('switch_allocator', 'islip'),
+            allocator_iterations=int(config.get('allocator_iterations', 1)),
+            fat_tree_k=None if fat_tree_k is None else int(fat_tree_k),
+            concentration=int(config.get('concentration', 4)),
+            express_interval=int(config.get('express_interval', 4)),
+            traffic_pattern=config.get('traffic_pattern', 'uniform_random'),
+            injection_rate=float(config.get('injection_rate', 0.0)),
+            hotspot_nodes=tuple(config.get('hotspot_nodes', [])),
+            hotspot_rate=float(config.get('hotspot_rate', 0.0)),
+            flit_width_bits=int(config.get('flit_width_bits', 128)),
+            chiplet=ChipletConfig.from_dict(config.get('chiplet_config', {})),
+            in_network_collectives=bool(config.get('in_network_collectives', in_network)),
+        )
@@ -1,18 +1,35 @@
+import collections
 import math
 from .router import Router, Port
+from .routing import select_routing
+from .config import SimConfig, LinkConfig
+from .collective import CollectiveEngine
+
+# GPU grids served by concentrated routers, optionally with links longer than one router.
+CONCENTRATED_TOPOLOGIES = ('cmesh', 'express_mesh', 'flattened_butterfly')
+
 
 class Network:
-    def __init__(self, config: dict, topology_override: str = None):
+    def __init__(self, config: SimConfig, topology_override: str = None, routing_override: str = None):
         self.config = config
-        self.num_gpus = config['num_gpus']
+        self.num_gpus = config.num_gpus
         self.grid_width, self.grid_height = None, None
+        self.fat_tree_k = None
+        self.chiplet_mesh = None
+        self.express_spans: list[int] | None = None
+        self.collective_engines: list[CollectiveEngine] = []
+        # Non-default link parameters (latency, width, VC count) keyed by (router, output port).
+        self.link_configs: dict[tuple[Router, int], LinkConfig] = {}
+        # Flits on multi-cycle links, keyed by the network cycle in which they reach the downstream buffer.
+        self.in_flight: dict[int, list] = collections.defaultdict(list)
         self.routers: dict[any, Router] = {}
         self.connections: dict[Router, dict[int, tuple]] = {}
         self.node_to_router_map: dict[int, tuple] = {}
-        topology_name = topology_override if topology_override else self.config.get('topology', 'mesh')
+        topology_name = topology_override if topology_override else self.config.topology
+        self.topology = topology_name
         print(f"{topology_name}")
 
-        if topology_name in ['mesh', 'torus']:
+        if topology_name in ['mesh', 'torus', *CONCENTRATED_TOPOLOGIES]:
             if not math.sqrt(self.num_gpus).is_integer():
                 raise ValueError("Not a Perfect Square")
             self.grid_width = int(math.sqrt(self.num_gpus))
@@ -21,12 +38,32 @@ class Network:
         if topology_name == 'mesh': self._create_mesh()
         elif topology_name == 'torus': self._create_torus()
         elif topology_name == 'fat_tree': self._create_fat_tree()
+        elif topology_name == 'chiplet': self._create_chiplet()
+        elif topology_name in CONCENTRATED_TOPOLOGIES: self._create_concentrated(topology_name)
         else: raise ValueError(f"Unknown topology: {topology_name}")
         self.router_port_to_node_map: dict[tuple[Router, Port], int] = \
             {val: key for key, val in self.node_to_router_map.items()}
+        # Routers are processed in this fixed order; active_mask has bit i set while router i holds flits.
+        self.router_list: list[Router] = list(self.routers.values())
+        self.active_mask = 0
+        self.cycles = 0
+        for index, router in enumerate(self.router_list):
+            router.active_bit = 1 << index
+        for router, links in self.connections.items():
+            for out_port, (dest_router, dest_in_port) in links.items():
+                router.connect(out_port, dest_router, dest_in_port)
+        for node_id, (router, port) in self.node_to_router_map.items():
+            router.mark_ejection_port(port, node_id)
+        for (router, port), link in self.link_configs.items():
+            serialization = -(-config.flit_width_bits // link.width_bits) if link.width_bits else 1
+            router.configure_link(port, link.latency, serialization, link.num_vcs)
+        routing_algo = routing_override or config.routing_algo
+        route_factory, adaptive, atomic_vcs = select_routing(topology_name, routing_algo, config.num_virtual_channels)
+        for router in self.router_list:
+            router.bind_routing(route_factory, adaptive, atomic_vcs)
 
     def _create_mesh(self):
-        num_vcs = self.config['num_virtual_channels']
+        num_vcs = self.config.num_virtual_channels
         for y in range(self.grid_height):
             for x in range(self.grid_width):
                 coords = (x, y)
@@ -41,7 +78,7 @@ class Network:
             if x > 0: self.connections[router][Port.WEST.value] = (self.routers[(x - 1, y)], Port.EAST.value)
 
     def _create_torus(self):
-        num_vcs = self.config['num_virtual_channels']
+        num_vcs = self.config.num_virtual_channels
         for y in range(self.grid_height):
             for x in range(self.grid_width):
                 coords = (x, y)
@@ -56,34 +93,210 @@ class Network:
             self.connections[router][Port.WEST.value] = (self.routers[((x - 1 + self.grid_width) % self.grid_width, y)], Port.EAST.value)
 
     def _create_fat_tree(self):
-        k = self.config.get('fat_tree_k', 4)
+        # Three-tier k-ary fat-tree: k pods of k/2 edge and k/2 aggregation switches, (k/2)^2 cores, k^3/4 hosts.
+        k = self.config.fat_tree_k
+        if k is None:
+            k = 2
+            while k ** 3 // 4 < self.num_gpus: k += 2
         if k % 2 != 0: raise ValueError("k has to even.")
-        num_pods, nodes_per_switch = k, k // 2
-        num_edge_switches, num_core_switches = num_pods * nodes_per_switch, (k // 2)**2
-        expected_nodes = num_edge_switches * nodes_per_switch
-        if self.num_gpus != expected_nodes: raise ValueError(f"k={k} Fat-Tree only supports {expected_nodes} nodes, not {self.num_gpus}")
-        num_vcs = self.config['num_virtual_channels']
-        core_switches = [Router(f'c_{i}', num_ports=k, num_vcs=num_vcs, network=self, config=self.config) for i in range(num_core_switches)]
-        edge_switches = [Router(f'e_{p}_{s}', num_ports=k, num_vcs=num_vcs, network=self, config=self.config) for p in range(num_pods) for s in range(k//2)]
-        for r in core_switches + edge_switches: self.routers[r.router_id] = r
-        for i in range(num_edge_switches):
-            edge_router = edge_switches[i]
-            pod, switch_in_pod = i // (k // 2), i % (k // 2)
-            for j in range(k // 2):
-                core_switch_idx = switch_in_pod * (k // 2) + j
-                core_router = core_switches[core_switch_idx]
-                edge_up_port, core_down_port = nodes_per_switch + j, pod
-                if edge_router not in self.connections: self.connections[edge_router] = {}
-                if core_router not in self.connections: self.connections[core_router] = {}
-                self.connections[edge_router][edge_up_port] = (core_router, core_down_port)
-                self.connections[core_router][core_down_port] = (edge_router, edge_up_port)
-        for i in range(num_edge_switches):
-            for j in range(nodes_per_switch):
-                node_id = i * nodes_per_switch + j
-                self.node_to_router_map[node_id] = (edge_switches[i], j)
+        half = k // 2
+        if self.num_gpus > k ** 3 // 4: raise ValueError(f"k={k} Fat-Tree supports at most {k ** 3 // 4} nodes, not {self.num_gpus}")
+        self.fat_tree_k = k
+        num_vcs = self.config.num_virtual_channels
+        # With in-network collectives every switch gets one extra port for its collective engine.
+        ports = k + 1 if self.config.in_network_collectives else k
+        core_switches = [Router(f'c_{i}', num_ports=ports, num_vcs=num_vcs, network=self, config=self.config) for i in range(half * half)]
+        agg_switches = [Router(f'a_{p}_{s}', num_ports=ports, num_vcs=num_vcs, network=self, config=self.config) for p in range(k) for s in range(half)]
+        edge_switches = [Router(f'e_{p}_{s}', num_ports=ports, num_vcs=num_vcs, network=self, config=self.config) for p in range(k) for s in range(half)]
+        for r in core_switches + agg_switches + edge_switches:
+            self.routers[r.router_id] = r
+            self.connections[r] = {}
+        for pod in range(k):
+            for i in range(half):
+                edge_router = edge_switches[pod * half + i]
+                for j in range(half):
+                    agg_router = agg_switches[pod * half + j]
+                    self.connections[edge_router][half + j] = (agg_router, i)
+                    self.connections[agg_router][i] = (edge_router, half + j)
+            for j in range(half):
+                agg_router = agg_switches[pod * half + j]
+                for m in range(half):
+                    core_router = core_switches[j * half + m]
+                    self.connections[agg_router][half + m] = (core_router, pod)
+                    self.connections[core_router][pod] = (agg_router, half + m)
+        for node_id in range(self.num_gpus):
+            self.node_to_router_map[node_id] = (edge_switches[node_id // half], node_id % half)
+        if self.config.in_network_collectives:
+            # Children are listed by one GPU in each subtree below the switch that holds any GPUs.
+            n = self.num_gpus
+            for edge in edge_switches:
+                first = (edge.pod_id * half + edge.switch_id) * half
+                self._attach_engine(edge, list(range(first, min(first + half, n))))
+            for agg in agg_switches:
+                firsts = [(agg.pod_id * half + s) * half for s in range(half)]
+                self._attach_engine(agg, [f for f in firsts if f < n])
+            for core in core_switches:
+                self._attach_engine(core, [p * half * half for p in range(k) if p * half * half < n])
+
+    def _attach_engine(self, router: Router, children: list[int]):
+        engine = CollectiveEngine(router, children)
+        router.attach_engine(engine)
+        self.collective_engines.append(engine)
+
+    def _create_concentrated(self, topology_name: str):
+        # Each router serves a block of block x block GPUs on LOCAL and the ports after it. Links to the
+        # adjacent routers use N/E/S/W; 'express_mesh' adds row and column links express_interval routers
+        # apart and 'flattened_butterfly' links every router to all others in its row and column.
+        concentration = self.config.concentration
+        block = math.isqrt(concentration)
+        if block * block != concentration or self.grid_width % block:
+            raise ValueError(f"Concentration {concentration} must be a square that tiles the {self.grid_width}x{self.grid_width} GPU grid")
+        width = self.router_grid_width = self.grid_width // block
+        if topology_name == 'flattened_butterfly': spans = list(range(2, width))
+        elif topology_name == 'express_mesh' and 1 < self.config.express_interval < width: spans = [self.config.express_interval]
+        else: spans = []
+        self.express_spans = spans
+        num_vcs = self.config.num_virtual_channels
+        # Per router coords: {target x: output port} along the row and {target y: output port} along the column.
+        self.row_ports: dict[tuple[int, int], dict[int, int]] = {}
+        self.col_ports: dict[tuple[int, int], dict[int, int]] = {}
+        for y in range(width):
+            for x in range(width):
+                row = {tx: port for tx, port in ((x - 1, Port.WEST.value), (x + 1, Port.EAST.value)) if 0 <= tx < width}
+                col = {ty: port for ty, port in ((y - 1, Port.NORTH.value), (y + 1, Port.SOUTH.value)) if 0 <= ty < width}
+                port = Port.LOCAL.value + concentration
+                for span in spans:
+                    for tx in (x - span, x + span):
+                        if 0 <= tx < width: row[tx], port = port, port + 1
+                    for ty in (y - span, y + span):
+                        if 0 <= ty < width: col[ty], port = port, port + 1
+                self.row_ports[(x, y)], self.col_ports[(x, y)] = row, col
+                self.routers[(x, y)] = Router((x, y), num_ports=port, num_vcs=num_vcs, network=self, config=self.config)
+        for (x, y), router in self.routers.items():
+            self.connections[router] = {}
+            for tx, port in self.row_ports[(x, y)].items():
+                self.connections[router][port] = (self.routers[(tx, y)], self.row_ports[(tx, y)][x])
+            for ty, port in self.col_ports[(x, y)].items():
+                self.connections[router][port] = (self.routers[(x, ty)], self.col_ports[(x, ty)][y])
+
+        self.node_router_x, self.node_router_y, self.node_port = [], [], []
+        for node_id in range(self.num_gpus):
+            gx, gy = node_id % self.grid_width, node_id // self.grid_width
+            port = Port.LOCAL.value + (gy % block) * block + gx % block
+            self.node_router_x.append(gx // block)
+            self.node_router_y.append(gy // block)
+            self.node_port.append(port)
+            self.node_to_router_map[node_id] = (self.routers[(gx // block, gy // block)], port)
+
+    def _create_chiplet(self):
+        # Packages tile a grid of chiplets, each chiplet is a mesh with one GPU per router. Neighbouring
+        # chiplets are joined by one gateway link per side, from the middle router of that side; the link
+        # parameters depend on whether the two chiplets share a package.
+        cfg = self.config.chiplet
+        cw, ch = cfg.chiplet_mesh
+        pcx, pcy = cfg.chiplets_per_package
+        px, py = cfg.packages
+        per_chiplet, per_package = cw * ch, pcx * pcy
+        num_chiplets = per_package * px * py
+        if self.num_gpus != num_chiplets * per_chiplet:
+            raise ValueError(f"Chiplet topology holds {num_chiplets * per_chiplet} nodes, not {self.num_gpus}")
+        if self.config.num_virtual_channels >= 2:
+            for link in (cfg.inter_chiplet_link, cfg.inter_package_link):
+                if link.num_vcs is not None and link.num_vcs < 2:
+                    raise ValueError("Inter-chiplet links need at least 2 VCs for hierarchical routing")
+        self.chiplet_mesh = (cw, ch)
+        # Chiplet ids are package-major, so the GPUs of a package are numbered contiguously.
+        self.chiplet_positions: list[tuple[int, int]] = [
+            ((p % px) * pcx + c % pcx, (p // px) * pcy + c // pcx) for p in range(px * py) for c in range(per_package)]
+        self.chiplet_at = chiplet_at = {pos: chip for chip, pos in enumerate(self.chiplet_positions)}
+        self.node_chiplet: list[int] = [n // per_chiplet for n in range(self.num_gpus)]
+        self.node_local: list[int] = [n % per_chiplet for n in range(self.num_gpus)]
+        # exit_sides[chip][dest_chip]: side of chip to leave through (chiplet-level X then Y), -1 if dest_chip == chip.
+        self.exit_sides: list[list[int]] = []
+        for cx, cy in self.chiplet_positions:
+            sides = []
+            for dx, dy in self.chiplet_positions:
+                if dx != cx: sides.append(Port.EAST.value if dx > cx else Port.WEST.value)
+                elif dy != cy: sides.append(Port.SOUTH.value if dy > cy else Port.NORTH.value)
+                else: sides.append(-1)
+            self.exit_sides.append(sides)
+        self.gateways = {Port.NORTH.value: (cw // 2, 0), Port.EAST.value: (cw - 1, ch // 2),
+                         Port.SOUTH.value: (cw // 2, ch - 1), Port.WEST.value: (0, ch // 2)}
+
+        num_vcs = self.config.num_virtual_channels
+        grid = []
+        for chip in range(num_chiplets):
+            chip_routers = {}
+            for ly in range(ch):
+                for lx in range(cw):
+                    router = Router(f'h_{chip}_{lx}_{ly}', num_ports=5, num_vcs=num_vcs, network=self, config=self.config)
+                    self.routers[router.router_id] = router
+                    self.connections[router] = {}
+                    chip_routers[(lx, ly)] = router
+                    self.node_to_router_map[chip * per_chiplet + ly * cw + lx] = (router, Port.LOCAL.value)
+            for (lx, ly), router in chip_routers.items():
+                if ly > 0: self.connections[router][Port.NORTH.value] = (chip_routers[(lx, ly - 1)], Port.SOUTH.value)
+                if lx < cw - 1: self.connections[router][Port.EAST.value] = (chip_routers[(lx + 1, ly)], Port.WEST.value)
+                if ly < ch - 1: self.connections[router][Port.SOUTH.value] = (chip_routers[(lx, ly + 1)], Port.NORTH.value)
+                if lx > 0: self.connections[router][Port.WEST.value] = (chip_routers[(lx - 1, ly)], Port.EAST.value)
+            grid.append(chip_routers)
+
+        for chip, (cx, cy) in enumerate(self.chiplet_positions):
+            for side, opposite, neighbour in ((Port.EAST.value, Port.WEST.value, (cx + 1, cy)),
+                                              (Port.SOUTH.value, Port.NORTH.value, (cx, cy + 1))):
+                other = chiplet_at.get(neighbour)
+                if other is None: continue
+                a, b = grid[chip][self.gateways[side]], grid[other][self.gateways[opposite]]
+                self.connections[a][side] = (b, opposite)
+                self.connections[b][opposite] = (a, side)
+                same_package = chip // per_package == other // per_package
+                link = cfg.inter_chiplet_link if same_package else cfg.inter_package_link
+                self.link_configs[(a, side)] = link
+                self.link_configs[(b, opposite)] = link
+
+    def _span_hops(self, delta: int) -> int:
+        hops = 0
+        for span in sorted(self.express_spans, reverse=True) + [1]:
+            hops, delta = hops + delta // span, delta % span
+        return hops
+
+    def hop_distance(self, src_id: int, dest_id: int) -> int:
+        # Router-to-router links on the route, the unit of Flit.hops; host links are not counted.
+        if self.express_spans is not None:
+            dx = abs(self.node_router_x[src_id] - self.node_router_x[dest_id])
+            dy = abs(self.node_router_y[src_id] - self.node_router_y[dest_id])
+            return self._span_hops(dx) + self._span_hops(dy)
+        if self.grid_width is not None:
+            dx = abs(src_id % self.grid_width - dest_id % self.grid_width)
+            dy = abs(src_id // self.grid_width - dest_id // self.grid_width)
+            if self.topology == 'torus':
+                dx, dy = min(dx, self.grid_width - dx), min(dy, self.grid_height - dy)
+            return dx + dy
+        if self.fat_tree_k is not None:
+            half = self.fat_tree_k // 2
+            if src_id // half == dest_id // half: return 0
+            return 2 if src_id // (half * half) == dest_id // (half * half) else 4
+        if self.chiplet_mesh is not None:
+            # Follows make_chiplet: XY to the exit gateway, across the gateway link, on from the opposite gateway.
+            cw = self.chiplet_mesh[0]
+            chip, dest_chip = self.node_chiplet[src_id], self.node_chiplet[dest_id]
+            x, y = self.node_local[src_id] % cw, self.node_local[src_id] // cw
+            steps = {Port.NORTH.value: (0, -1), Port.EAST.value: (1, 0), Port.SOUTH.value: (0, 1), Port.WEST.value: (-1, 0)}
+            hops = 0
+            while chip != dest_chip:
+                side = self.exit_sides[chip][dest_chip]
+                gx, gy = self.gateways[side]
+                hops += abs(x - gx) + abs(y - gy) + 1
+                cx, cy = self.chiplet_positions[chip]
+                step_x, step_y = steps[side]
+                chip = self.chiplet_at[(cx + step_x, cy + step_y)]
+                x, y = self.gateways[(side + 2) % 4]
+            dest_local = self.node_local[dest_id]
+            return hops + abs(x - dest_local % cw) + abs(y - dest_local // cw)
+        return 0
 
     def get_router(self, router_id: any) -> Router:
         return self.routers.get(router_id)
 
     def __repr__(self) -> str:
-        return f"Network(Topology: {self.config.get('topology', 'mesh')})"
\ No newline at end of file
+        return f"Network(Topology: {self.topology})"
\ No newline at end of file
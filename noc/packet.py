@@ -10,11 +10,14 @@ class PacketType(Enum):
     WRITE = auto()
     RESPONSE = auto()
     SNOOP = auto()
+    REDUCE = auto()
+    MULTICAST = auto()
 
 class FlitType(Enum):
     HEAD = auto()
     BODY = auto()
     TAIL = auto()
+    HEAD_TAIL = auto()
 
 @dataclass
 class Packet:
@@ -38,6 +41,9 @@ class Flit:
     src_address: int
     dest_address: int
     use_secondary_network: bool = False
+    hops: int = 0
+    packet_type: PacketType = PacketType.WRITE
+    transaction_id: int = 0
 
     def __repr__(self):
         network_marker = " (Sec)" if self.use_secondary_network else " (Pri)"
@@ -1,8 +1,9 @@
 import collections
 import math
 from enum import IntEnum, auto
-import random
-from .packet import Flit
+from .packet import Flit, FlitType
+from .allocator import RoundRobinArbiter, make_allocator
+from .config import SimConfig
 
 class Network:
     pass
@@ -13,17 +14,62 @@ class Port(IntEnum):
     PORT_8, PORT_9, PORT_10, PORT_11, PORT_12, PORT_13, PORT_14, PORT_15 = 8, 9, 10, 11, 12, 13, 14, 15
 
 class Router:
-    def __init__(self, router_id: any, num_ports: int, num_vcs: int, network: 'Network', config: dict):
+    def __init__(self, router_id: any, num_ports: int, num_vcs: int, network: 'Network', config: SimConfig):
         self.router_id = router_id
         self.num_ports = num_ports
         self.num_vcs = num_vcs
         self.network = network
         self.config = config
-        self.buffer_depth = config.get('router_buffer_size', 8)
+        self.buffer_depth = config.router_buffer_size
         self.input_buffers: dict[int, list] = {p: [collections.deque() for _ in range(num_vcs)] for p in range(num_ports)}
-        self.vc_arbiter_state: dict[int, int] = {p: 0 for p in range(num_ports)}
-        
+
+        # Per input VC (index in_port * num_vcs + vc): output port and output VC held by the packet at its front.
+        num_ivcs = num_ports * num_vcs
+        self.iv_buffers: list[collections.deque] = [buf for p in range(num_ports) for buf in self.input_buffers[p]]
+        self.iv_port: list[int] = [iv // num_vcs for iv in range(num_ivcs)]
+        self.iv_route: list[int] = [-1] * num_ivcs
+        self.iv_out_vc: list[int] = [-1] * num_ivcs
+        self.iv_route_mask: list[int] = [0] * num_ivcs
+        # Pipeline stage bitmasks over input VCs: awaiting route computation, VC allocation, switch allocation.
+        self.rc_mask, self.va_mask, self.sa_mask = 0, 0, 0
+        self.out_vc_busy = 0
+        # Output VCs whose downstream buffer still holds flits; with atomic VC allocation they are not granted.
+        self.out_vc_occupied = 0
+        self.atomic_vcs = False
+        self.route_fn = None
+        self.credits: list[int] = [self.buffer_depth] * num_ivcs
+        self.upstream: list[tuple['Router', int] | None] = [None] * num_ports
+        # Per output port: (downstream router, its input port) for links, or the node id for ejection ports.
+        self.out_links: list[tuple['Router', int] | None] = [None] * num_ports
+        self.eject_nodes: list[int] = [-1] * num_ports
+        self.all_vcs_mask = (1 << num_vcs) - 1
+        self.active_bit = 0
+        # Optional in-network collective engine on the last port (fat-tree switches only).
+        self.engine = None
+        self.engine_port = -1
+        # Link parameters per output port: output VCs the link carries, cycles until a flit reaches the
+        # downstream buffer, and cycles the port stays busy per flit on links narrower than a flit.
+        self.port_vc_masks: list[int] = [self.all_vcs_mask] * num_ports
+        self.out_delays: list[int] = [1] * num_ports
+        self.serialization: list[int] = [1] * num_ports
+        self.port_free_at: list[int] = [0] * num_ports
+        self.serialized_ports = 0
+
+        iterations = config.allocator_iterations
+        self.vc_allocator = make_allocator(config.vc_allocator, num_ivcs, num_ivcs, iterations)
+        self.switch_allocator = make_allocator(config.switch_allocator, num_ports, num_ports, iterations)
+        self.vc_arbiters = [RoundRobinArbiter() for _ in range(num_ports)]
+        self._va_requests: list[int] = [0] * num_ivcs
+        self._sa_requests: list[int] = [0] * num_ports
+        self._sa_vc_requests: list[int] = [0] * (num_ports * num_ports)
+
+        # Activity counters for the energy model; link traversals are counted per output port by the simulator.
+        self.buffer_writes, self.buffer_reads, self.route_computations = 0, 0, 0
+        self.vc_grants, self.switch_grants, self.active_cycles = 0, 0, 0
+        self.link_traversals: list[int] = [0] * num_ports
+
         self.type, self.pod_id, self.switch_id, self.coords, self.grid_width = None, None, None, None, None
+        self.chiplet_id = None
         if isinstance(router_id, tuple):
             self.type = 'grid'
             self.coords = router_id
@@ -31,120 +77,194 @@ class Router:
         elif isinstance(router_id, str) and '_' in router_id:
             parts = router_id.split('_')
             if parts[0] == 'e': self.type, self.pod_id, self.switch_id = 'edge', int(parts[1]), int(parts[2])
+            elif parts[0] == 'a': self.type, self.pod_id, self.switch_id = 'agg', int(parts[1]), int(parts[2])
             elif parts[0] == 'c': self.type, self.switch_id = 'core', int(parts[1])
+            elif parts[0] == 'h':
+                self.type, self.chiplet_id, self.coords = 'chiplet', int(parts[1]), (int(parts[2]), int(parts[3]))
+                self.grid_width = network.chiplet_mesh[0]
 
-    def _get_dest_coords(self, flit: Flit) -> tuple:
-        if self.grid_width is None: return (None, None)
-        return (flit.dest_address % self.grid_width, flit.dest_address // self.grid_width)
-
-    def _get_buffer_fullness(self, port: int) -> float:
-        if port not in self.network.connections.get(self, {}): return 1.0
-        dest_router, dest_in_port = self.network.connections[self][port]
-        total_used = sum(len(vc) for vc in dest_router.input_buffers[dest_in_port])
-        return total_used / (self.num_vcs * self.buffer_depth)
-
-    def _compute_route_adaptive(self, flit: Flit) -> int:
-        dest_x, dest_y = self._get_dest_coords(flit)
-        if (dest_x, dest_y) == self.coords: return Port.LOCAL.value
-        possible_ports = []
-        if dest_x > self.coords[0]: possible_ports.append(Port.EAST.value)
-        if dest_x < self.coords[0]: possible_ports.append(Port.WEST.value)
-        if dest_y > self.coords[1]: possible_ports.append(Port.SOUTH.value)
-        if dest_y < self.coords[1]: possible_ports.append(Port.NORTH.value)
-        if not possible_ports: return Port.LOCAL.value
-        return min(possible_ports, key=lambda p: self._get_buffer_fullness(p))
-
-    def _compute_route_xy(self, flit: Flit) -> int:
-        dest_x, dest_y = self._get_dest_coords(flit)
-        if self.network.config.get('topology') == 'torus':
-            if dest_x != self.coords[0]:
-                dist_right = (dest_x - self.coords[0] + self.grid_width) % self.grid_width
-                return Port.EAST.value if dist_right <= self.grid_width / 2 else Port.WEST.value
-            elif dest_y != self.coords[1]:
-                dist_south = (dest_y - self.coords[1] + self.grid_width) % self.grid_width
-                return Port.SOUTH.value if dist_south <= self.grid_width / 2 else Port.NORTH.value
-        else:
-            if dest_x != self.coords[0]: return Port.EAST.value if dest_x > self.coords[0] else Port.WEST.value
-            elif dest_y != self.coords[1]: return Port.SOUTH.value if dest_y > self.coords[1] else Port.NORTH.value
-        return Port.LOCAL.value
-
-    def _get_fat_tree_dest_info(self, dest_address: int):
-        k = self.config.get('fat_tree_k', 4)
-        nodes_per_switch = k // 2
-        edge_switches_per_pod = k // 2
-        dest_edge_id = dest_address // nodes_per_switch
-        dest_pod = dest_edge_id // edge_switches_per_pod
-        return dest_edge_id, dest_pod
-
-    def _compute_route_fat_tree(self, flit: Flit) -> int:
-        k = self.config.get('fat_tree_k', 4)
-        nodes_per_switch = k // 2
-        dest_edge_id, dest_pod = self._get_fat_tree_dest_info(flit.dest_address)
-        if self.type == 'edge':
-            current_edge_id = self.pod_id * (k//2) + self.switch_id
-            if dest_edge_id == current_edge_id: return flit.dest_address % nodes_per_switch
-            else: return nodes_per_switch + (flit.packet_id % (k // 2))
-        elif self.type == 'core': return dest_pod
-        raise TypeError("Unknown router type for Fat-Tree")
-
-    def _compute_route_fat_tree_adaptive(self, flit: Flit) -> int:
-        k = self.config.get('fat_tree_k', 4)
-        nodes_per_switch = k // 2
-        dest_edge_id, dest_pod = self._get_fat_tree_dest_info(flit.dest_address)
-        if self.type == 'edge':
-            current_edge_id = self.pod_id * (k//2) + self.switch_id
-            if dest_edge_id == current_edge_id:
-                return flit.dest_address % nodes_per_switch
-            else:
-                up_ports = range(nodes_per_switch, k)
-                port_fullness = {p: self._get_buffer_fullness(p) for p in up_ports}
-                if not port_fullness: return nodes_per_switch 
-                min_fullness = min(port_fullness.values())
-                best_ports = [p for p, f in port_fullness.items() if f == min_fullness]
-                return random.choice(best_ports)
-        elif self.type == 'core':
-            return dest_pod
-        raise TypeError("Unknown router type for Fat-Tree")
+    @property
+    def idle_cycles(self) -> int:
+        return self.network.cycles - self.active_cycles
 
-    def process_cycle(self) -> dict[int, Flit]:
-        routing_requests: dict[int, list] = collections.defaultdict(list)
-        for in_port, vcs in self.input_buffers.items():
-            for vc_id, buffer in enumerate(vcs):
-                if buffer:
-                    head_flit = buffer[0]
-                    routing_algo = self.config.get('routing_algo')
-                    out_port = -1
-
-                    if self.type in ['edge', 'core']:
-                        if routing_algo == 'adaptive':
-                            out_port = self._compute_route_fat_tree_adaptive(head_flit)
-                        else:
-                            out_port = self._compute_route_fat_tree(head_flit)
-                    elif self.type == 'grid':
-                        if routing_algo == 'adaptive':
-                           
-                           #out_port is broken
-                            out_port = self._compute_route_adaptive(head_flit)
-    
-                        else:
-                            out_port = self._compute_route_xy(head_flit)
-                    else:
-                        raise TypeError(f"Router {self.router_id} has unknown type: {self.type}")
-
-                    if out_port != -1:
-                        routing_requests[out_port].append((head_flit, in_port, vc_id))
+    def bind_routing(self, route_factory, adaptive: bool, atomic_vcs: bool = False):
+        # Specialize once: the route callable closes over this router's position, and deterministic
+        # routing skips re-evaluating routes while a head flit waits for a VC. Atomic VC allocation only
+        # hands out output VCs whose downstream buffer is empty, as escape-VC (Duato) routing requires.
+        self.route_fn = route_factory(self)
+        self._vc_allocation = self._vc_allocation_adaptive if adaptive else self._vc_allocation_static
+        if adaptive: self._route_computation = self._defer_route_computation
+        self.atomic_vcs = atomic_vcs
+
+    def connect(self, out_port: int, dest_router: 'Router', dest_in_port: int):
+        self.out_links[out_port] = (dest_router, dest_in_port)
+        dest_router.upstream[dest_in_port] = (self, out_port)
+
+    def configure_link(self, out_port: int, latency: int, serialization: int, num_vcs: int | None):
+        self.out_delays[out_port] = latency + serialization - 1
+        self.serialization[out_port] = serialization
+        if serialization > 1: self.serialized_ports |= 1 << out_port
+        if num_vcs is not None: self.port_vc_masks[out_port] &= (1 << num_vcs) - 1
+
+    def attach_engine(self, engine):
+        # The engine drains every flit it is sent, like an ejection port, and injects into the same port.
+        self.engine = engine
+        self.engine_port = self.num_ports - 1
+        for vc in range(self.num_vcs): self.credits[self.engine_port * self.num_vcs + vc] = math.inf
+
+    def mark_ejection_port(self, port: int, node_id: int):
+        # Nodes always sink flits, so ejection ports never run out of credits.
+        self.eject_nodes[port] = node_id
+        for vc in range(self.num_vcs): self.credits[port * self.num_vcs + vc] = math.inf
+
+    def can_accept(self, in_port: int, vc_id: int) -> bool:
+        return len(self.input_buffers[in_port][vc_id]) < self.buffer_depth
+
+    def buffer_write(self, in_port: int, flit: Flit):
+        iv = in_port * self.num_vcs + flit.vc_id
+        buffer = self.iv_buffers[iv]
+        if not buffer:
+            if self.iv_out_vc[iv] >= 0: self.sa_mask |= 1 << iv
+            else: self.rc_mask |= 1 << iv
+            self.network.active_mask |= self.active_bit
+        buffer.append(flit)
+        self.buffer_writes += 1
+
+    def _route_computation(self):
+        mask, route_fn, buffers, ports, route_masks = self.rc_mask, self.route_fn, self.iv_buffers, self.iv_port, self.iv_route_mask
+        while mask:
+            low = mask & -mask
+            mask ^= low
+            iv = low.bit_length() - 1
+            route_masks[iv] = route_fn(buffers[iv][0], ports[iv])
+        self.route_computations += self.rc_mask.bit_count()
+        self.va_mask |= self.rc_mask
+        self.rc_mask = 0
+
+    def _defer_route_computation(self):
+        # Adaptive VC allocation routes every waiting head itself, starting in the cycle the head arrives.
+        self.va_mask |= self.rc_mask
+        self.rc_mask = 0
+
+    def _vc_allocation_static(self):
+        requests, input_mask, mask, busy, route_masks = self._va_requests, 0, self.va_mask, self.out_vc_busy, self.iv_route_mask
+        while mask:
+            low = mask & -mask
+            mask ^= low
+            iv = low.bit_length() - 1
+            free_vcs = route_masks[iv] & ~busy
+            if free_vcs:
+                requests[iv] = free_vcs
+                input_mask |= low
+        if input_mask: self._grant_vcs(input_mask)
+
+    def _vc_allocation_adaptive(self):
+        requests, input_mask, mask, busy = self._va_requests, 0, self.va_mask, self.unavailable_vcs()
+        route_fn, buffers, ports, route_masks = self.route_fn, self.iv_buffers, self.iv_port, self.iv_route_mask
+        self.route_computations += mask.bit_count()
+        while mask:
+            low = mask & -mask
+            mask ^= low
+            iv = low.bit_length() - 1
+            route_masks[iv] = route_fn(buffers[iv][0], ports[iv])
+            free_vcs = route_masks[iv] & ~busy
+            if free_vcs:
+                requests[iv] = free_vcs
+                input_mask |= low
+        if input_mask: self._grant_vcs(input_mask)
+
+    _vc_allocation = _vc_allocation_static
+
+    def unavailable_vcs(self) -> int:
+        return self.out_vc_busy | self.out_vc_occupied if self.atomic_vcs else self.out_vc_busy
+
+    def _grant_vcs(self, input_mask: int):
+        nv = self.num_vcs
+        grants = self.vc_allocator.allocate(input_mask, self._va_requests)
+        self.vc_grants += len(grants)
+        for iv, out_ivc in grants:
+            self.iv_route[iv], self.iv_out_vc[iv] = divmod(out_ivc, nv)
+            self.out_vc_busy |= 1 << out_ivc
+            self.va_mask ^= 1 << iv
+            self.sa_mask |= 1 << iv
+
+    def _switch_allocation(self) -> dict[int, Flit]:
+        nv, num_ports = self.num_vcs, self.num_ports
+        requests, vc_requests, credits = self._sa_requests, self._sa_vc_requests, self.credits
+        iv_route, iv_out_vc, iv_port = self.iv_route, self.iv_out_vc, self.iv_port
+        input_mask, mask = 0, self.sa_mask
+        blocked = 0
+        if self.serialized_ports:
+            cycle, free_at = self.network.cycles, self.port_free_at
+            for port in range(num_ports):
+                if free_at[port] > cycle: blocked |= 1 << port
+        while mask:
+            low = mask & -mask
+            mask ^= low
+            iv = low.bit_length() - 1
+            out_port = iv_route[iv]
+            if credits[out_port * nv + iv_out_vc[iv]] > 0 and not blocked >> out_port & 1:
+                in_port = iv_port[iv]
+                requests[in_port] |= 1 << out_port
+                vc_requests[in_port * num_ports + out_port] |= 1 << (iv - in_port * nv)
+                input_mask |= 1 << in_port
+        if not input_mask: return {}
 
         forwarded_flits: dict[int, Flit] = {}
-        for out_port, requests in routing_requests.items():
-            if not requests: continue
-            start_index = self.vc_arbiter_state.get(out_port, 0)
-            for i in range(len(requests)):
-                winner_index = (start_index + i) % len(requests)
-                _flit, in_port, vc_id = requests[winner_index]
-                self.vc_arbiter_state[out_port] = (winner_index + 1) % len(requests)
-                forwarded_flits[out_port] = self.input_buffers[in_port][vc_id].popleft()
-                break
+        for in_port, out_port in self.switch_allocator.allocate(input_mask, requests):
+            key = in_port * num_ports + out_port
+            arbiter = self.vc_arbiters[in_port]
+            vc = arbiter.pick(vc_requests[key])
+            arbiter.advance(vc)
+            forwarded_flits[out_port] = self._send(in_port, vc, out_port)
+        self.switch_grants += len(forwarded_flits)
+        while input_mask:
+            low = input_mask & -input_mask
+            input_mask ^= low
+            in_port = low.bit_length() - 1
+            outputs, requests[in_port] = requests[in_port], 0
+            while outputs:
+                bit = outputs & -outputs
+                outputs ^= bit
+                vc_requests[in_port * num_ports + bit.bit_length() - 1] = 0
         return forwarded_flits
 
+    def _send(self, in_port: int, vc: int, out_port: int) -> Flit:
+        nv = self.num_vcs
+        iv = in_port * nv + vc
+        buffer = self.iv_buffers[iv]
+        flit = buffer.popleft()
+        self.buffer_reads += 1
+        out_vc = self.iv_out_vc[iv]
+        out_ivc = out_port * nv + out_vc
+        self.credits[out_ivc] -= 1
+        if self.out_links[out_port] is not None: self.out_vc_occupied |= 1 << out_ivc
+        upstream = self.upstream[in_port]
+        if upstream is not None:
+            up_router, up_ivc = upstream[0], upstream[1] * nv + vc
+            up_router.credits[up_ivc] += 1
+            if up_router.credits[up_ivc] == self.buffer_depth: up_router.out_vc_occupied &= ~(1 << up_ivc)
+        flit.vc_id = out_vc
+        if self.serialized_ports >> out_port & 1:
+            self.port_free_at[out_port] = self.network.cycles + self.serialization[out_port]
+        if flit.flit_type is FlitType.TAIL or flit.flit_type is FlitType.HEAD_TAIL:
+            self.out_vc_busy &= ~(1 << out_ivc)
+            self.iv_route[iv], self.iv_out_vc[iv] = -1, -1
+            self.sa_mask &= ~(1 << iv)
+            if buffer: self.rc_mask |= 1 << iv
+        elif not buffer:
+            self.sa_mask &= ~(1 << iv)
+        return flit
+
+    def is_active(self) -> bool:
+        return bool(self.rc_mask or self.va_mask or self.sa_mask)
+
+    def process_cycle(self) -> dict[int, Flit]:
+        self.active_cycles += 1
+        if self.rc_mask: self._route_computation()
+        if self.va_mask: self._vc_allocation()
+        if not self.sa_mask: return {}
+        return self._switch_allocation()
+
     def __repr__(self) -> str:
-        return f"Router({self.router_id})"
\ No newline at end of file
+        return f"Router({self.router_id})"
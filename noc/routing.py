@@ -0,0 +1,315 @@
+import warnings
+from .packet import Flit, PacketType
+from .router import Port, Router
+
+# Each routing factory specializes a route(flit, in_port) callable for one router at construction time.
+# Routes are bitmasks of admissible output VCs, bit (out_port * num_vcs + vc).
+NORTH, EAST, SOUTH, WEST, LOCAL = Port.NORTH.value, Port.EAST.value, Port.SOUTH.value, Port.WEST.value, Port.LOCAL.value
+
+
+def _free_credits(router: Router, port: int) -> int:
+    nv = router.num_vcs
+    return sum(router.credits[port * nv:(port + 1) * nv])
+
+
+def _least_congested(router: Router, ports: list[int]) -> int:
+    if len(ports) == 1: return ports[0]
+    return max(ports, key=lambda p: _free_credits(router, p))
+
+
+def _mesh_dor_port(x: int, y: int, dest_x: int, dest_y: int) -> int:
+    if dest_x != x: return EAST if dest_x > x else WEST
+    if dest_y != y: return SOUTH if dest_y > y else NORTH
+    return LOCAL
+
+
+def _mesh_minimal_ports(x: int, y: int, dest_x: int, dest_y: int) -> list[int]:
+    ports = []
+    if dest_x > x: ports.append(EAST)
+    if dest_x < x: ports.append(WEST)
+    if dest_y > y: ports.append(SOUTH)
+    if dest_y < y: ports.append(NORTH)
+    return ports
+
+
+def make_mesh_xy(router: Router):
+    x, y, width, nv, all_vcs = *router.coords, router.grid_width, router.num_vcs, router.all_vcs_mask
+    port_masks = [all_vcs << (p * nv) for p in range(LOCAL + 1)]
+
+    def route(flit: Flit, in_port: int) -> int:
+        dest = flit.dest_address
+        dest_x = dest % width
+        if dest_x != x: return port_masks[EAST] if dest_x > x else port_masks[WEST]
+        dest_y = dest // width
+        if dest_y != y: return port_masks[SOUTH] if dest_y > y else port_masks[NORTH]
+        return port_masks[LOCAL]
+    return route
+
+
+def make_mesh_west_first(router: Router):
+    x, y, width, nv, all_vcs = *router.coords, router.grid_width, router.num_vcs, router.all_vcs_mask
+
+    def route(flit: Flit, in_port: int) -> int:
+        dest_x, dest_y = flit.dest_address % width, flit.dest_address // width
+        if dest_x < x: port = WEST
+        else:
+            ports = _mesh_minimal_ports(x, y, dest_x, dest_y)
+            port = _least_congested(router, ports) if ports else LOCAL
+        return all_vcs << (port * nv)
+    return route
+
+
+def make_mesh_odd_even(router: Router):
+    # Chiu's odd-even turn model: no EN/ES turns in even columns, no NW/SW turns in odd columns.
+    x, y, width, nv, all_vcs = *router.coords, router.grid_width, router.num_vcs, router.all_vcs_mask
+
+    def route(flit: Flit, in_port: int) -> int:
+        dest_x, dest_y = flit.dest_address % width, flit.dest_address // width
+        src_x = flit.src_address % width
+        vertical = SOUTH if dest_y > y else NORTH
+        ports = []
+        if dest_x == x:
+            if dest_y == y: return all_vcs << (LOCAL * nv)
+            ports.append(vertical)
+        elif dest_x > x:
+            if dest_y == y: ports.append(EAST)
+            else:
+                if x % 2 == 1 or x == src_x: ports.append(vertical)
+                if dest_x % 2 == 1 or dest_x - x != 1: ports.append(EAST)
+        else:
+            ports.append(WEST)
+            if dest_y != y and x % 2 == 0: ports.append(vertical)
+        return all_vcs << (_least_congested(router, ports) * nv)
+    return route
+
+
+def make_mesh_duato(router: Router):
+    # VC 0 is the XY escape channel; the remaining VCs route fully adaptively over minimal ports.
+    x, y, width, nv, all_vcs = *router.coords, router.grid_width, router.num_vcs, router.all_vcs_mask
+    adaptive_vcs = all_vcs & ~1
+
+    def route(flit: Flit, in_port: int) -> int:
+        dest_x, dest_y = flit.dest_address % width, flit.dest_address // width
+        escape_port = _mesh_dor_port(x, y, dest_x, dest_y)
+        if escape_port == LOCAL: return all_vcs << (LOCAL * nv)
+        adaptive_port = _least_congested(router, _mesh_minimal_ports(x, y, dest_x, dest_y))
+        return (1 << (escape_port * nv)) | (adaptive_vcs << (adaptive_port * nv))
+    return route
+
+
+def _torus_dimension(cur: int, dest: int, size: int) -> tuple[bool, bool]:
+    """Returns (positive direction, remaining path crosses the wraparound link) along one ring."""
+    positive = (dest - cur + size) % size <= size / 2
+    return positive, (dest < cur) if positive else (dest > cur)
+
+
+def _torus_dor(x: int, y: int, dest_x: int, dest_y: int, width: int) -> tuple[int, bool]:
+    if dest_x != x:
+        positive, wraps = _torus_dimension(x, dest_x, width)
+        return (EAST if positive else WEST), wraps
+    if dest_y != y:
+        positive, wraps = _torus_dimension(y, dest_y, width)
+        return (SOUTH if positive else NORTH), wraps
+    return LOCAL, False
+
+
+def make_torus_dor(router: Router):
+    # Dateline classes: packets that still have to cross the wraparound link use the lower half of the VCs.
+    x, y, width, nv, all_vcs = *router.coords, router.grid_width, router.num_vcs, router.all_vcs_mask
+    low_class = (1 << (nv // 2)) - 1 if nv >= 2 else all_vcs
+    high_class = all_vcs & ~low_class if nv >= 2 else all_vcs
+
+    def route(flit: Flit, in_port: int) -> int:
+        port, wraps = _torus_dor(x, y, flit.dest_address % width, flit.dest_address // width, width)
+        if port == LOCAL: return all_vcs << (LOCAL * nv)
+        return (low_class if wraps else high_class) << (port * nv)
+    return route
+
+
+def make_torus_duato(router: Router):
+    # VCs 0/1 form a dateline-ordered DOR escape network; the remaining VCs are fully adaptive.
+    x, y, width, nv, all_vcs = *router.coords, router.grid_width, router.num_vcs, router.all_vcs_mask
+    adaptive_vcs = all_vcs & ~3
+
+    def route(flit: Flit, in_port: int) -> int:
+        dest_x, dest_y = flit.dest_address % width, flit.dest_address // width
+        escape_port, wraps = _torus_dor(x, y, dest_x, dest_y, width)
+        if escape_port == LOCAL: return all_vcs << (LOCAL * nv)
+        ports = []
+        if dest_x != x: ports.append(EAST if _torus_dimension(x, dest_x, width)[0] else WEST)
+        if dest_y != y: ports.append(SOUTH if _torus_dimension(y, dest_y, width)[0] else NORTH)
+        adaptive_port = _least_congested(router, ports)
+        return (1 << (escape_port * nv + (0 if wraps else 1))) | (adaptive_vcs << (adaptive_port * nv))
+    return route
+
+
+def _flow_hash(flit: Flit) -> int:
+    # ECMP hash over (src, dst): every packet of a flow takes the same path, so flows stay in order.
+    h = (flit.src_address * 0x9E3779B1 ^ flit.dest_address * 0x85EBCA77) & 0xFFFFFFFF
+    return (h ^ (h >> 15)) * 0x2C1B3C6D & 0xFFFFFFFF
+
+
+def _make_fat_tree(router: Router, adaptive: bool):
+    half, nv, all_vcs = router.network.fat_tree_k // 2, router.num_vcs, router.all_vcs_mask
+    port_masks = [all_vcs << (p * nv) for p in range(2 * half)]
+    kind = router.type
+    if kind not in ('edge', 'agg', 'core'): raise TypeError("Unknown router type for Fat-Tree")
+    hash_shift = 8 if kind == 'agg' else 0
+
+    def uplinks(flit: Flit) -> int:
+        if not adaptive: return port_masks[half + (_flow_hash(flit) >> hash_shift) % half]
+        # Congestion-aware: every uplink with the most free credits is admissible to the VC allocator.
+        credits = [_free_credits(router, p) for p in range(half, 2 * half)]
+        best = max(credits)
+        mask = 0
+        for offset, c in enumerate(credits):
+            if c == best: mask |= port_masks[half + offset]
+        return mask
+
+    # One closure per switch kind, so the per-flit path never compares router types.
+    if kind == 'edge':
+        my_edge_id = router.pod_id * half + router.switch_id
+
+        def route(flit: Flit, in_port: int) -> int:
+            dest = flit.dest_address
+            if dest // half == my_edge_id: return port_masks[dest % half]
+            return uplinks(flit)
+    elif kind == 'agg':
+        pod_id = router.pod_id
+
+        def route(flit: Flit, in_port: int) -> int:
+            dest_edge_id = flit.dest_address // half
+            if dest_edge_id // half == pod_id: return port_masks[dest_edge_id % half]
+            return uplinks(flit)
+    else:
+        pod_size = half * half
+
+        def route(flit: Flit, in_port: int) -> int:
+            return port_masks[flit.dest_address // pod_size]
+    if router.engine is None: return route
+
+    # Collective packets stop at the engine of every switch on their tree; the engine's own REDUCE output
+    # climbs to the tree's aggregation switch (collective id % half) and core ((id // half) % half).
+    engine_port, engine_mask = router.engine_port, all_vcs << (router.engine_port * nv)
+    REDUCE, MULTICAST = PacketType.REDUCE, PacketType.MULTICAST
+    num_trees = half * half
+    tree_uplinks = [port_masks[half + (tree % half if kind == 'edge' else tree // half)] for tree in range(num_trees)]
+
+    def collective_route(flit: Flit, in_port: int) -> int:
+        packet_type = flit.packet_type
+        if packet_type is REDUCE:
+            if in_port != engine_port: return engine_mask
+            return tree_uplinks[flit.transaction_id % num_trees]
+        if packet_type is MULTICAST and in_port != engine_port: return engine_mask
+        return route(flit, in_port)
+    return collective_route
+
+
+def make_fat_tree(router: Router):
+    return _make_fat_tree(router, False)
+
+
+def make_fat_tree_adaptive(router: Router):
+    return _make_fat_tree(router, True)
+
+
+def make_chiplet(router: Router):
+    # Hierarchical DOR: chiplet-level X then Y between chiplets, XY inside a chiplet to the gateway of the exit
+    # side or to the destination. The X phase uses the even VCs, the Y phase and final delivery the odd VCs.
+    network, nv, all_vcs = router.network, router.num_vcs, router.all_vcs_mask
+    x, y = router.coords
+    width, height = network.chiplet_mesh
+    even = sum(1 << vc for vc in range(0, nv, 2))
+    classes = (even, all_vcs & ~even) if nv >= 2 else (all_vcs, all_vcs)
+
+    def port_mask(port: int, vc_class: int) -> int:
+        if port == LOCAL: return all_vcs << (LOCAL * nv)
+        return (vc_class & router.port_vc_masks[port]) << (port * nv)
+
+    local_masks = [port_mask(_mesh_dor_port(x, y, l % width, l // width), classes[1]) for l in range(width * height)]
+    exit_masks = [0] * 4
+    for side, (gx, gy) in network.gateways.items():
+        port = side if (x, y) == (gx, gy) else _mesh_dor_port(x, y, gx, gy)
+        exit_masks[side] = port_mask(port, classes[side in (NORTH, SOUTH)])
+    chiplet_masks = [exit_masks[side] if side >= 0 else 0 for side in network.exit_sides[router.chiplet_id]]
+    node_chiplet, node_local = network.node_chiplet, network.node_local
+
+    def route(flit: Flit, in_port: int) -> int:
+        dest = flit.dest_address
+        return chiplet_masks[node_chiplet[dest]] or local_masks[node_local[dest]]
+    return route
+
+
+def _greedy_port_masks(links: dict[int, int], pos: int, size: int, nv: int, all_vcs: int) -> list[int]:
+    # For every destination coordinate: the longest link toward it that does not overshoot, 0 if already there.
+    masks = [0] * size
+    for dest in range(size):
+        if dest == pos: continue
+        hops = [target for target in links if 0 < (target - pos) * (1 if dest > pos else -1) <= abs(dest - pos)]
+        masks[dest] = all_vcs << (links[max(hops, key=lambda target: abs(target - pos))] * nv)
+    return masks
+
+
+def make_concentrated_dor(router: Router):
+    # Table-driven DOR for concentrated, express and flattened-butterfly grids: X then Y, always taking the
+    # longest link that does not overshoot, so each dimension is traversed monotonically.
+    network, nv, all_vcs = router.network, router.num_vcs, router.all_vcs_mask
+    x, y = router.coords
+    width = network.router_grid_width
+    x_masks = _greedy_port_masks(network.row_ports[(x, y)], x, width, nv, all_vcs)
+    y_masks = _greedy_port_masks(network.col_ports[(x, y)], y, width, nv, all_vcs)
+    local_masks = [all_vcs << (p * nv) for p in range(router.num_ports)]
+    node_x, node_y, node_port = network.node_router_x, network.node_router_y, network.node_port
+
+    def route(flit: Flit, in_port: int) -> int:
+        dest = flit.dest_address
+        return x_masks[node_x[dest]] or y_masks[node_y[dest]] or local_masks[node_port[dest]]
+    return route
+
+
+ROUTING_FACTORIES = {
+    ('mesh', 'deterministic'): make_mesh_xy,
+    ('mesh', 'west_first'): make_mesh_west_first,
+    ('mesh', 'odd_even'): make_mesh_odd_even,
+    ('mesh', 'duato'): make_mesh_duato,
+    ('torus', 'deterministic'): make_torus_dor,
+    ('torus', 'duato'): make_torus_duato,
+    ('fat_tree', 'deterministic'): make_fat_tree,
+    ('fat_tree', 'adaptive'): make_fat_tree_adaptive,
+    ('chiplet', 'deterministic'): make_chiplet,
+    ('cmesh', 'deterministic'): make_concentrated_dor,
+    ('express_mesh', 'deterministic'): make_concentrated_dor,
+    ('flattened_butterfly', 'deterministic'): make_concentrated_dor,
+}
+ROUTING_ALIASES = {'xy': 'deterministic', 'dor': 'deterministic', 'up_down': 'deterministic', 'ecmp': 'deterministic'}
+# 'adaptive' selects the deadlock-free fully adaptive algorithm of each topology.
+ADAPTIVE_DEFAULTS = {'mesh': 'duato', 'torus': 'duato', 'fat_tree': 'adaptive', 'chiplet': 'deterministic',
+                     'cmesh': 'deterministic', 'express_mesh': 'deterministic', 'flattened_butterfly': 'deterministic'}
+DETERMINISTIC_ALGOS = {'deterministic'}
+KNOWN_ALGOS = {algo for _, algo in ROUTING_FACTORIES}
+# Escape-VC routing is only deadlock-free if a packet never queues behind another in a reallocated VC.
+ATOMIC_VC_ALGOS = {'duato'}
+
+
+def select_routing(topology: str, routing_algo: str, num_vcs: int):
+    """Returns (routing factory, whether routes must be re-evaluated while waiting for a VC, whether VC allocation is atomic)."""
+    algo = ROUTING_ALIASES.get(routing_algo, routing_algo or 'deterministic')
+    if algo == 'adaptive': algo = ADAPTIVE_DEFAULTS.get(topology, algo)
+    if (topology, algo) not in ROUTING_FACTORIES and algo in KNOWN_ALGOS and topology in ADAPTIVE_DEFAULTS:
+        # e.g. one global `routing_algo: west_first` in a hybrid mesh + fat-tree system.
+        fallback = ADAPTIVE_DEFAULTS[topology]
+        warnings.warn(f"Routing algorithm '{algo}' is not supported on topology '{topology}'; using '{fallback}'.")
+        algo = fallback
+    if topology == 'mesh' and algo == 'duato' and num_vcs < 2:
+        warnings.warn("Duato routing needs an escape VC plus at least one adaptive VC; falling back to west-first.")
+        algo = 'west_first'
+    if topology == 'torus' and algo == 'duato' and num_vcs < 3:
+        warnings.warn("Torus Duato routing needs two escape VCs plus at least one adaptive VC; falling back to DOR.")
+        algo = 'deterministic'
+    if topology == 'torus' and num_vcs < 2:
+        warnings.warn("Torus dateline routing needs at least 2 VCs; wraparound deadlock is possible.")
+    if topology == 'chiplet' and num_vcs < 2:
+        warnings.warn("Chiplet routing needs at least 2 VCs to separate its routing phases; deadlock is possible.")
+    if (topology, algo) not in ROUTING_FACTORIES:
+        raise ValueError(f"Routing algorithm '{routing_algo}' is not supported on topology '{topology}'")
+    return ROUTING_FACTORIES[(topology, algo)], algo not in DETERMINISTIC_ALGOS, algo in ATOMIC_VC_ALGOS
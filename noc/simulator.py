@@ -1,110 +1,152 @@
 from .network import Network
 from .node import Node
 from .router import Router
-from metrics.tracker import MetricsTracker
-from .workload import AllReduceWorkload
+from .packet import FlitType
+from metrics.tracker import MetricsTracker, make_record_store
+from .workload import AllReduceWorkload, RequestResponseWorkload
+from .steering import SteeringPolicy
+from .traffic import TrafficMatrix, is_matrix_pattern
+from .config import SimConfig
+from .watchdog import Watchdog
 
 class Simulator:
     def __init__(self, config: dict):
         print("Starting simulator")
         self.config = config
-        self.architecture = config.get('architecture', 'monolithic')
-        self.num_gpus = config['num_gpus']
-        self.tracker = MetricsTracker()
+        self.sim_config = SimConfig.from_dict(config)
+        self.architecture = self.sim_config.architecture
+        self.num_gpus = self.sim_config.num_gpus
+        self.tracker = MetricsTracker(make_record_store(config))
 
         self.primary_network: Network | None = None
         self.secondary_network: Network | None = None
 
         if self.architecture == 'hybrid_electrical':
-            primary_topo = self.config.get('topology', 'mesh')
-            secondary_topo = self.config['hybrid_electrical_config']['secondary_topology']
-            self.primary_network = Network(config, topology_override=primary_topo)
-            self.secondary_network = Network(config, topology_override=secondary_topo)
+            self.primary_network = Network(self.sim_config, topology_override=self.sim_config.topology)
+            self.secondary_network = Network(self.sim_config, topology_override=self.sim_config.secondary_topology,
+                                             routing_override=self.sim_config.secondary_routing_algo)
         else:
-            self.primary_network = Network(config)
+            self.primary_network = Network(self.sim_config)
+
+        self.steering: SteeringPolicy | None = None
+        if self.secondary_network:
+            self.steering = SteeringPolicy(config, self.primary_network, self.secondary_network)
+
+        self.traffic_matrix: TrafficMatrix | None = None
+        if is_matrix_pattern(self.sim_config.traffic_pattern):
+            self.traffic_matrix = TrafficMatrix.from_config(config, self.num_gpus, self.primary_network.grid_width)
 
         self.nodes: list[Node] = []
         for i in range(self.num_gpus):
             coords = None
             if self.primary_network and self.primary_network.grid_width is not None:
                 coords = (i % self.primary_network.grid_width, i // self.primary_network.grid_width)
-            node = Node(node_id=i, coords=coords, config=self.config, tracker=self.tracker)
+            node = Node(node_id=i, coords=coords, config=self.sim_config, tracker=self.tracker, steering=self.steering,
+                        traffic_matrix=self.traffic_matrix)
             self.nodes.append(node)
 
         self.workload = None
-        if self.config.get('traffic_pattern') == 'all_reduce':
+        if self.sim_config.traffic_pattern == 'all_reduce':
             self.workload = AllReduceWorkload(self.config, self.tracker, self.nodes)
-        
+        elif self.sim_config.traffic_pattern == 'request_response':
+            self.workload = RequestResponseWorkload(self.config, self.tracker, self.nodes)
+
+        # Injection targets are resolved once: (node, primary (router, port), secondary (router, port) or None).
+        self.injection_ports = [
+            (node, self.primary_network.node_to_router_map[node.node_id],
+             self.secondary_network.node_to_router_map[node.node_id] if self.secondary_network else None)
+            for node in self.nodes
+        ]
+        self.networks = [n for n in (self.primary_network, self.secondary_network) if n]
+        self.collective_engines = [engine for n in self.networks for engine in n.collective_engines]
+        if getattr(self.workload, 'in_network', False) and not self.collective_engines:
+            raise ValueError("In-network all-reduce needs a fat-tree network with in-network collectives")
+        self.watchdog = Watchdog.from_config(config, self.networks)
         self.current_cycle = 0
-    
-    def run(self, num_cycles: int):
-        if self.workload:
-            print("Running workload-driven simulation until completion")
-            self.workload.initialize(self.current_cycle)
-            timeout_cycles = self.config.get('simulation_timeout_cycles', 500000)
-
-            while not self.workload.is_complete():
-                self._single_cycle()
-                if self.current_cycle > timeout_cycles:
-                    print(f"ERROR: Simulation timed out after {timeout_cycles} cycles. Possible deadlock or bug.")
-                    break
-        else:
-            print(f"Running simulation for {num_cycles} cycles...")
-            for i in range(num_cycles):
-                if i % 500 == 0 and i > 0:
-                    print(f"--- Cycle {i} ---")
-                self._single_cycle()
-        
-        print(f"Simulation finished at cycle {self.current_cycle} ---")
-
-
-    def _process_network_cycle(self, network: Network | None):
-        if not network: return
 
-        forwarding_decisions = {r: r.process_cycle() for r in network.routers.values()}
-
-        for router, decisions in forwarding_decisions.items():
+    def _process_network_cycle(self, network: Network):
+        # Only routers holding flits are stepped; the rest are idle this cycle.
+        network.cycles += 1
+        routers, mask, still_active = network.router_list, network.active_mask, 0
+        forwarding_decisions = []
+        while mask:
+            low = mask & -mask
+            mask ^= low
+            router = routers[low.bit_length() - 1]
+            decisions = router.process_cycle()
+            if decisions: forwarding_decisions.append((router, decisions))
+            if router.is_active(): still_active |= low
+        network.active_mask = still_active
+
+        for router, decisions in forwarding_decisions:
+            out_links, out_delays = router.out_links, router.out_delays
             for out_port, flit in decisions.items():
-                if (router, out_port) in network.router_port_to_node_map:
-                    continue
-                dest_router, dest_in_port = network.connections[router][out_port]
-                dest_router.input_buffers[dest_in_port][flit.vc_id].append(flit)
-
-        for router, decisions in forwarding_decisions.items():
+                link = out_links[out_port]
+                if link is not None:
+                    delay = out_delays[out_port]
+                    if delay > 1: network.in_flight[network.cycles + delay - 1].append((link, flit))
+                    else: link[0].buffer_write(link[1], flit)
+                    router.link_traversals[out_port] += 1
+                    flit.hops += 1
+        if network.in_flight:
+            for (dest_router, dest_port), flit in network.in_flight.pop(network.cycles, ()):
+                dest_router.buffer_write(dest_port, flit)
+
+        for router, decisions in forwarding_decisions:
+            eject_nodes, engine_port = router.eject_nodes, router.engine_port
             for out_port, ejected_flit in decisions.items():
-                if (router, out_port) in network.router_port_to_node_map:
-                    dest_node_id = network.router_port_to_node_map[(router, out_port)]
+                dest_node_id = eject_nodes[out_port]
+                if out_port == engine_port:
+                    router.engine.receive(ejected_flit)
+                elif dest_node_id >= 0:
                     packet_info = self.nodes[dest_node_id].receive_flit(ejected_flit, self.current_cycle)
+                    if self.steering and packet_info:
+                        self.steering.on_packet_delivered(packet_info['src_address'], packet_info['dest_address'],
+                                                          packet_info['packet_type'])
                     if self.workload and packet_info:
                         self.workload.on_packet_received(
                             node_id=packet_info['dest_address'],
                             src_id=packet_info['src_address'],
-                            current_cycle=self.current_cycle
+                            current_cycle=self.current_cycle,
+                            packet_type=packet_info['packet_type'],
+                            transaction_id=packet_info['transaction_id']
                         )
 
-    def _single_cycle(self):
-
-        self._process_network_cycle(self.primary_network)
-        self._process_network_cycle(self.secondary_network)
+    def _record_injection(self, flit):
+        if flit.flit_type is FlitType.HEAD or flit.flit_type is FlitType.HEAD_TAIL:
+            self.tracker.record_packet_injection(flit.packet_id, self.current_cycle)
 
-        for node in self.nodes:
-            if node.injection_queue:
-                flit_to_inject = node.injection_queue[0]
-
-                if flit_to_inject.use_secondary_network and self.secondary_network:
-                    flit = node.injection_queue.popleft()
-                    router, port = self.secondary_network.node_to_router_map[node.node_id]
-                    router.input_buffers[port][flit.vc_id].append(flit)
-                else:
-                    flit = node.injection_queue.popleft()
-                    router, port = self.primary_network.node_to_router_map[node.node_id]
-                    router.input_buffers[port][flit.vc_id].append(flit)
+    def _single_cycle(self):
+        for network in self.networks:
+            self._process_network_cycle(network)
+
+        recording = self.tracker.records is not None
+        for node, (router, port), secondary in self.injection_ports:
+            queue = node.injection_queue
+            if queue and router.can_accept(port, queue[0].vc_id):
+                flit = queue.popleft()
+                router.buffer_write(port, flit)
+                if recording: self._record_injection(flit)
+            queue = node.secondary_injection_queue
+            if queue and secondary and secondary[0].can_accept(secondary[1], queue[0].vc_id):
+                flit = queue.popleft()
+                secondary[0].buffer_write(secondary[1], flit)
+                if recording: self._record_injection(flit)
+
+        for engine in self.collective_engines:
+            queue, router = engine.queue, engine.router
+            if queue and router.can_accept(router.engine_port, queue[0].vc_id):
+                router.buffer_write(router.engine_port, queue.popleft())
 
-        if not self.workload:
+        if self.workload:
+            self.workload.process_cycle(self.current_cycle)
+        else:
             for node in self.nodes:
                 node.process_cycle(self.current_cycle)
 
         self.current_cycle += 1
+        if self.watchdog is not None and self.current_cycle >= self.watchdog.next_check:
+            self.watchdog.check(self.current_cycle)
 
     def run(self, num_cycles: int):
         print(f"Running simulation for {num_cycles} cycles...")
@@ -0,0 +1,76 @@
+from .network import Network
+from .packet import Packet, PacketType
+from .collective import COLLECTIVE_PACKET_TYPES
+
+STEERING_POLICIES = ('traffic_pattern', 'class', 'size', 'distance', 'load')
+
+
+class SteeringPolicy:
+    """Chooses the primary or secondary network for each packet in hybrid mode."""
+
+    def __init__(self, config: dict, primary_network: Network, secondary_network: Network | None):
+        self.primary_network = primary_network
+        self.secondary_network = secondary_network
+        self.traffic_pattern = config.get('traffic_pattern', 'uniform_random')
+        hybrid_config = config.get('hybrid_electrical_config', {})
+        self.secondary_traffic = hybrid_config.get('secondary_traffic', [])
+        steering = hybrid_config.get('steering', {})
+        self.policy = steering.get('policy', 'traffic_pattern')
+        if self.policy not in STEERING_POLICIES: raise ValueError(f"Unknown steering policy: {self.policy}")
+        self.secondary_classes = {c.lower() for c in steering.get('secondary_classes', [])}
+        self.size_threshold = steering.get('size_threshold_flits', 4)
+        self.distance_threshold = steering.get('distance_threshold_hops', 4)
+        self.load_balance = steering.get('load_balance', self.policy == 'load')
+        self.load_margin = steering.get('load_margin', 0.25)
+        self.in_order = steering.get('in_order', True)
+        # (src, dst) -> [uses secondary, packets in flight]; a flow stays pinned to one network while it has packets in flight.
+        self.flows: dict[tuple[int, int], list] = {}
+        self.packets_steered = [0, 0]
+
+    def _preferred(self, packet: Packet) -> bool:
+        if self.policy == 'traffic_pattern': return self.traffic_pattern in self.secondary_traffic
+        if self.policy == 'class':
+            return packet.packet_type.name.lower() in self.secondary_classes or self.traffic_pattern in self.secondary_classes
+        if self.policy == 'size': return packet.payload_size >= self.size_threshold
+        if self.policy == 'distance':
+            return self.primary_network.hop_distance(packet.src_address, packet.dest_address) >= self.distance_threshold
+        return False
+
+    def _injection_load(self, network: Network, node) -> float:
+        router, port = network.node_to_router_map[node.node_id]
+        queue = node.secondary_injection_queue if network is self.secondary_network else node.injection_queue
+        buffered = sum(len(vc) for vc in router.input_buffers[port])
+        return (len(queue) + buffered) / (router.num_vcs * router.buffer_depth)
+
+    def select(self, node, packet: Packet) -> bool:
+        """Returns True if the packet should use the secondary network."""
+        if self.secondary_network is None: return False
+        if packet.packet_type in COLLECTIVE_PACKET_TYPES:
+            # Collectives go to the network whose switches can reduce them, preferring the secondary expressway.
+            use_secondary = bool(self.secondary_network.collective_engines) or not self.primary_network.collective_engines
+            self.packets_steered[use_secondary] += 1
+            return use_secondary
+        flow = (packet.src_address, packet.dest_address)
+        pinned = self.flows.get(flow) if self.in_order else None
+        if pinned and pinned[1] > 0:
+            use_secondary = pinned[0]
+        else:
+            use_secondary = self._preferred(packet)
+            if self.load_balance:
+                primary_load = self._injection_load(self.primary_network, node)
+                secondary_load = self._injection_load(self.secondary_network, node)
+                if use_secondary and secondary_load > primary_load + self.load_margin: use_secondary = False
+                elif not use_secondary and primary_load > secondary_load + self.load_margin: use_secondary = True
+        if self.in_order:
+            if pinned: pinned[0], pinned[1] = use_secondary, pinned[1] + 1
+            else: self.flows[flow] = [use_secondary, 1]
+        self.packets_steered[use_secondary] += 1
+        return use_secondary
+
+    def on_packet_delivered(self, src_id: int, dest_id: int, packet_type: PacketType = PacketType.WRITE):
+        # Collective packets and the multicast copies made in the switches are never counted against a flow.
+        if not self.in_order or packet_type in COLLECTIVE_PACKET_TYPES: return
+        flow = self.flows.get((src_id, dest_id))
+        if flow:
+            flow[1] -= 1
+            if flow[1] <= 0: del self.flows[(src_id, dest_id)]
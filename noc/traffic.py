@@ -0,0 +1,148 @@
+import math
+import random
+
+# Synthetic patterns: generator(num_nodes, width, params) -> per-source {destination: weight} rows.
+# Generated rows are normalized and scaled to `injection_rate`; matrix files give absolute rates.
+
+
+def _bits(num_nodes: int) -> int:
+    if num_nodes & (num_nodes - 1): raise ValueError(f"Bit permutation patterns need a power-of-two node count, not {num_nodes}")
+    return num_nodes.bit_length() - 1
+
+
+def _grid(num_nodes: int, width: int | None) -> tuple[int, int]:
+    width = width or math.isqrt(num_nodes)
+    return (width, num_nodes // width) if width and num_nodes % width == 0 else (num_nodes, 1)
+
+
+def bit_complement(num_nodes: int, width: int | None, params: dict) -> list[dict[int, float]]:
+    _bits(num_nodes)
+    return [{~src & (num_nodes - 1): 1.0} for src in range(num_nodes)]
+
+
+def bit_reversal(num_nodes: int, width: int | None, params: dict) -> list[dict[int, float]]:
+    bits = _bits(num_nodes)
+    return [{int(f'{src:0{bits}b}'[::-1], 2) if bits else 0: 1.0} for src in range(num_nodes)]
+
+
+def shuffle(num_nodes: int, width: int | None, params: dict) -> list[dict[int, float]]:
+    bits = _bits(num_nodes)
+    return [{((src << 1) | (src >> (bits - 1))) & (num_nodes - 1) if bits else 0: 1.0} for src in range(num_nodes)]
+
+
+def _grid_shift(num_nodes: int, width: int | None, shift) -> list[dict[int, float]]:
+    width, height = _grid(num_nodes, width)
+    return [{(src // width + shift(height)) % height * width + (src % width + shift(width)) % width: 1.0}
+            for src in range(num_nodes)]
+
+
+def tornado(num_nodes: int, width: int | None, params: dict) -> list[dict[int, float]]:
+    return _grid_shift(num_nodes, width, lambda k: (k + 1) // 2 - 1)
+
+
+def neighbor(num_nodes: int, width: int | None, params: dict) -> list[dict[int, float]]:
+    return _grid_shift(num_nodes, width, lambda k: 1 if k > 1 else 0)
+
+
+def grouped(num_nodes: int, width: int | None, params: dict) -> list[dict[int, float]]:
+    # All-to-all inside groups of `group_size` nodes `group_stride` apart: stride 1 gives contiguous
+    # tensor-parallel groups, larger strides give e.g. expert-parallel groups spread across the system.
+    size, stride = params.get('group_size', 4), params.get('group_stride', 1)
+    block = size * stride
+    if num_nodes % block: raise ValueError(f"{num_nodes} nodes do not divide into groups of {size} with stride {stride}")
+    rows = []
+    for src in range(num_nodes):
+        base = src // block * block + src % stride
+        rows.append({base + j * stride: 1.0 for j in range(size)})
+    return rows
+
+
+def pipeline(num_nodes: int, width: int | None, params: dict) -> list[dict[int, float]]:
+    # Stage s of a pipeline of `group_size`-node stages sends to the same rank of stage s + 1.
+    size = params.get('group_size', 4)
+    return [{(src + size) % num_nodes: 1.0} for src in range(num_nodes)]
+
+
+TRAFFIC_GENERATORS = {
+    'bit_complement': bit_complement,
+    'bit_reversal': bit_reversal,
+    'shuffle': shuffle,
+    'tornado': tornado,
+    'neighbor': neighbor,
+    'grouped': grouped,
+    'pipeline': pipeline,
+}
+
+
+def load_matrix(path: str) -> list[dict[int, float]]:
+    """Reads an N x N rate matrix from a .npy file or a whitespace/comma separated text file."""
+    if path.endswith('.npy'):
+        import numpy as np
+        dense = np.load(path).tolist()
+    else:
+        with open(path) as f:
+            dense = [[float(v) for v in line.replace(',', ' ').split()] for line in f if line.strip() and not line.startswith('#')]
+    return [{dst: rate for dst, rate in enumerate(row) if rate > 0} for row in dense]
+
+
+class TrafficMatrix:
+    """Per-source destination distributions with Vose alias tables, so each sample is O(1)."""
+
+    def __init__(self, rows: list[dict[int, float]]):
+        self.num_nodes = len(rows)
+        self.rates: list[float] = []
+        self._tables: list[tuple[list[int], list[float], list[int]]] = []
+        for src, row in enumerate(rows):
+            if any(not 0 <= dst < self.num_nodes for dst in row):
+                raise ValueError(f"Traffic matrix row {src} names a destination outside 0..{self.num_nodes - 1}")
+            row = {dst: rate for dst, rate in row.items() if dst != src and rate > 0}
+            self.rates.append(min(float(sum(row.values())), 1.0))
+            self._tables.append(_alias_table(row))
+
+    @classmethod
+    def from_config(cls, config: dict, num_nodes: int, width: int | None = None) -> 'TrafficMatrix':
+        pattern, matrix_config = config.get('traffic_pattern'), config.get('traffic_matrix', {})
+        if pattern == 'matrix':
+            if not matrix_config.get('file'):
+                raise ValueError("traffic_pattern 'matrix' needs traffic_matrix.file (an N x N rate matrix)")
+            rows = load_matrix(matrix_config['file'])
+            if len(rows) != num_nodes:
+                raise ValueError(f"Traffic matrix in {matrix_config['file']} is not {num_nodes} x {num_nodes}")
+            scale = matrix_config.get('scale', 1.0)
+            return cls([{dst: rate * scale for dst, rate in row.items()} for row in rows])
+        rows = TRAFFIC_GENERATORS[pattern](num_nodes, width, matrix_config)
+        rate = config.get('injection_rate', 0.0)
+        scaled = []
+        for src, row in enumerate(rows):
+            row = {dst: w for dst, w in row.items() if dst != src}
+            total = sum(row.values())
+            scaled.append({dst: rate * w / total for dst, w in row.items()} if total else {})
+        return cls(scaled)
+
+    def sample(self, src: int) -> int:
+        dests, prob, alias = self._tables[src]
+        r = random.random() * len(dests)
+        i = int(r)
+        return dests[i] if r - i < prob[i] else dests[alias[i]]
+
+
+def _alias_table(row: dict[int, float]) -> tuple[list[int], list[float], list[int]]:
+    if not row: return [], [], []
+    dests = list(row)
+    total = sum(row.values())
+    n = len(dests)
+    prob = [row[d] * n / total for d in dests]
+    alias = list(range(n))
+    small = [i for i, p in enumerate(prob) if p < 1.0]
+    large = [i for i, p in enumerate(prob) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        prob[l] -= 1.0 - prob[s]
+        (small if prob[l] < 1.0 else large).append(l)
+    for i in small + large: prob[i] = 1.0
+    return dests, prob, alias
+
+
+def is_matrix_pattern(pattern: str) -> bool:
+    return pattern == 'matrix' or pattern in TRAFFIC_GENERATORS
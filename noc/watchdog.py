@@ -0,0 +1,155 @@
+class NetworkStallError(RuntimeError):
+    """Raised by the watchdog when a run cannot finish; `report` lists the input VCs involved."""
+
+    def __init__(self, report: dict):
+        self.report = report
+        lines = [f"{report['kind'].upper()} in {report['network']} network at cycle {report['cycle']}:"]
+        for vc in report['vcs']:
+            lines.append(f"  {vc['router']} port {vc['in_port']} VC {vc['vc']}: packet {vc['packet_id']} "
+                         f"{vc['src']}->{vc['dst']} waiting in {vc['stage']} for {vc['waiting_cycles']} cycles")
+        super().__init__('\n'.join(lines))
+
+
+class Watchdog:
+    """Samples the head flit of every occupied input VC every `check_interval` cycles.
+
+    When some head flit has not moved for `stall_cycles`, it builds the wait-for graph between input VCs
+    (credit waits point downstream, VC-allocation waits point at the holders of the requested output VCs)
+    and prunes every VC that can still make progress; anything left is deadlocked. Heads stuck for
+    `starvation_cycles` outside any deadlock, or more than `max_hops` links away from their source,
+    are reported as starvation or livelock.
+    """
+
+    def __init__(self, networks: list, check_interval: int = 256, stall_cycles: int = 2000,
+                 starvation_cycles: int = 20000, max_hops: int | None = None):
+        self.networks = networks
+        self.check_interval = check_interval
+        self.stall_cycles = stall_cycles
+        self.starvation_cycles = starvation_cycles
+        self.max_hops = max_hops
+        self.next_check = check_interval
+        # Per network: (router index, input VC) -> (head flit, cycle it was first seen at the head).
+        self.heads: list[dict[tuple[int, int], tuple]] = [{} for _ in networks]
+
+    @classmethod
+    def from_config(cls, config: dict, networks: list) -> 'Watchdog | None':
+        watchdog_config = config.get('watchdog', {})
+        if not watchdog_config.get('enabled', True): return None
+        return cls(networks, check_interval=watchdog_config.get('check_interval', 256),
+                   stall_cycles=watchdog_config.get('stall_cycles', 2000),
+                   starvation_cycles=watchdog_config.get('starvation_cycles', 20000),
+                   max_hops=watchdog_config.get('max_hops'))
+
+    def check(self, cycle: int):
+        self.next_check = cycle + self.check_interval
+        for index, network in enumerate(self.networks):
+            max_hops = self.max_hops or 4 * len(network.router_list)
+            previous, heads, stalled = self.heads[index], {}, []
+            for r, router in enumerate(network.router_list):
+                occupied = router.rc_mask | router.va_mask | router.sa_mask
+                while occupied:
+                    low = occupied & -occupied
+                    occupied ^= low
+                    iv = low.bit_length() - 1
+                    flit = router.iv_buffers[iv][0]
+                    seen = previous.get((r, iv))
+                    since = seen[1] if seen and seen[0] is flit else cycle
+                    heads[(r, iv)] = (flit, since)
+                    if flit.hops > max_hops: self._fail('livelock', network, cycle, [(r, iv)], heads)
+                    if cycle - since >= self.stall_cycles: stalled.append((r, iv))
+            self.heads[index] = heads
+            if not stalled: continue
+            deadlocked = self._deadlock_cycle(network)
+            if deadlocked: self._fail('deadlock', network, cycle, deadlocked, heads)
+            starved = [key for key in stalled if cycle - heads[key][1] >= self.starvation_cycles]
+            if starved: self._fail('starvation', network, cycle, starved, heads)
+
+    def _deadlock_cycle(self, network) -> list[tuple[int, int]]:
+        routers = network.router_list
+        index_of = {id(router): r for r, router in enumerate(routers)}
+        waits: dict[tuple[int, int], list[tuple[int, int]]] = {}
+        progress = []
+        for r, router in enumerate(routers):
+            occupied = router.va_mask | router.sa_mask
+            can_route = router.rc_mask
+            while can_route:
+                low = can_route & -can_route
+                can_route ^= low
+                progress.append((r, low.bit_length() - 1))
+            while occupied:
+                low = occupied & -occupied
+                occupied ^= low
+                iv = low.bit_length() - 1
+                targets = self._wait_targets(router, iv, index_of)
+                if targets is None: progress.append((r, iv))
+                else: waits[(r, iv)] = targets
+
+        # Every VC that waits on a VC that can progress can progress too; what remains is deadlocked.
+        waiters: dict[tuple[int, int], list[tuple[int, int]]] = {}
+        for node, targets in waits.items():
+            for target in targets: waiters.setdefault(target, []).append(node)
+        free = set(progress)
+        while progress:
+            for node in waiters.get(progress.pop(), ()):
+                if node not in free:
+                    free.add(node)
+                    progress.append(node)
+        blocked = {node for node in waits if node not in free}
+        if not blocked: return []
+        # Walk blocked wait edges until a VC repeats to report one concrete cycle.
+        path, position, node = [], {}, next(iter(blocked))
+        while node not in position:
+            position[node] = len(path)
+            path.append(node)
+            node = next(t for t in waits[node] if t in blocked)
+        return path[position[node]:]
+
+    def _wait_targets(self, router, iv: int, index_of: dict) -> list[tuple[int, int]] | None:
+        """Input VCs this VC's head flit waits for, or None if nothing stops it from advancing."""
+        nv = router.num_vcs
+        if router.iv_out_vc[iv] >= 0:
+            out_port, out_vc = router.iv_route[iv], router.iv_out_vc[iv]
+            link = router.out_links[out_port]
+            if link is None or router.credits[out_port * nv + out_vc] > 0: return None
+            downstream, in_port = link
+            target = (index_of[id(downstream)], in_port * nv + out_vc)
+            return [target] if downstream.iv_buffers[target[1]] else None
+        requested = router.iv_route_mask[iv]
+        if requested & ~router.unavailable_vcs(): return None
+        targets = []
+        while requested:
+            low = requested & -requested
+            requested ^= low
+            out_port, out_vc = divmod(low.bit_length() - 1, nv)
+            if router.out_vc_busy & low: holder = self._holder(router, out_port, out_vc, index_of)
+            else:
+                # Released but not yet drained (atomic VC allocation): waits for the downstream buffer.
+                downstream, in_port = router.out_links[out_port]
+                holder = (index_of[id(downstream)], in_port * nv + out_vc)
+                if not downstream.iv_buffers[holder[1]]: holder = None
+            if holder is None: return None
+            targets.append(holder)
+        return targets
+
+    def _holder(self, router, out_port: int, out_vc: int, index_of: dict) -> tuple[int, int] | None:
+        # The input VC whose packet owns (out_port, out_vc); if its flits have all left, the upstream VC still feeding it.
+        nv = router.num_vcs
+        while True:
+            iv = next((i for i in range(len(router.iv_out_vc))
+                       if router.iv_route[i] == out_port and router.iv_out_vc[i] == out_vc), None)
+            if iv is None: return None
+            if router.iv_buffers[iv]: return index_of[id(router)], iv
+            upstream = router.upstream[iv // nv]
+            if upstream is None: return None
+            router, out_port, out_vc = upstream[0], upstream[1], iv % nv
+
+    def _fail(self, kind: str, network, cycle: int, nodes: list[tuple[int, int]], heads: dict):
+        vcs = []
+        for r, iv in nodes:
+            router = network.router_list[r]
+            flit, since = heads.get((r, iv), (router.iv_buffers[iv][0], cycle))
+            stage = 'switch allocation' if router.iv_out_vc[iv] >= 0 else 'VC allocation'
+            vcs.append({'router': router.router_id, 'in_port': iv // router.num_vcs, 'vc': iv % router.num_vcs,
+                        'packet_id': flit.packet_id, 'src': flit.src_address, 'dst': flit.dest_address,
+                        'stage': stage, 'waiting_cycles': cycle - since})
+        raise NetworkStallError({'kind': kind, 'cycle': cycle, 'network': network.topology, 'vcs': vcs})
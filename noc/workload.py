@@ -1,4 +1,7 @@
+import collections
+import random
 from .node import Node
+from .packet import PacketType
 
 class AllReduceWorkload:
 
@@ -10,17 +13,32 @@ class AllReduceWorkload:
         
         self.data_size = config.get('workload', {}).get('all_reduce_data_size', 1)
         self.chunk_size_flits = config.get('workload', {}).get('all_reduce_chunk_size_flits', 4)
+        # 'ring' sends 2(N-1) unicast chunks per node; 'in_network' sends each chunk once as a REDUCE
+        # packet that fat-tree switches aggregate, and receives the result as a MULTICAST.
+        self.algorithm = config.get('workload', {}).get('all_reduce_algorithm', 'ring')
+        if self.algorithm not in ('ring', 'in_network'): raise ValueError(f"Unknown all-reduce algorithm: {self.algorithm}")
+        self.in_network = self.algorithm == 'in_network'
+        self.reduce_packet_ids: dict[tuple[int, int], int] = {}
 
         self.node_states = [{'phase': 'IDLE', 'step': 0, 'chunk_idx': 0} for _ in range(self.num_nodes)]
 
     def initialize(self, start_cycle: int):
 
-        print(f"[{start_cycle}] WORKLOAD: Starting Ring All-Reduce for {self.num_nodes} nodes, {self.data_size} chunks.")
+        name = 'In-Network' if self.in_network else 'Ring'
+        print(f"[{start_cycle}] WORKLOAD: Starting {name} All-Reduce for {self.num_nodes} nodes, {self.data_size} chunks.")
         if self.data_size <= 0:
             for i in range(self.num_nodes):
                 self.node_states[i]['phase'] = 'IDLE'
             return
-            
+
+        if self.in_network:
+            for node in self.nodes:
+                self.node_states[node.node_id]['phase'] = 'IN_NETWORK'
+                for chunk in range(self.data_size):
+                    packet = node.inject_workload_packet(node.node_id, self.chunk_size_flits, start_cycle, chunk, PacketType.REDUCE)
+                    self.reduce_packet_ids[(node.node_id, chunk)] = packet.packet_id
+            return
+
         for i in range(self.num_nodes):
             self.node_states[i]['phase'] = 'SCATTER_REDUCE'
             self._send_next_packet(i, start_cycle)
@@ -32,10 +50,21 @@ class AllReduceWorkload:
                 return False
         return True
 
-    def on_packet_received(self, node_id: int, src_id: int, current_cycle: int):
+    def process_cycle(self, current_cycle: int):
+        pass
+
+    def on_packet_received(self, node_id: int, src_id: int, current_cycle: int,
+                           packet_type: PacketType = PacketType.WRITE, transaction_id: int = 0):
         state = self.node_states[node_id]
         if state['phase'] == 'IDLE':
             return
+        if self.in_network:
+            if packet_type is PacketType.MULTICAST:
+                # The chunk's all-reduce latency runs from its REDUCE packet's creation to the result's arrival.
+                self.tracker.record_packet_receipt(self.reduce_packet_ids.pop((node_id, transaction_id)), current_cycle)
+                state['chunk_idx'] += 1
+                if state['chunk_idx'] >= self.data_size: state['phase'] = 'IDLE'
+            return
 
         current_phase = state['phase']
         is_phase_complete = state['step'] == self.num_nodes - 2
@@ -55,6 +84,12 @@ class AllReduceWorkload:
         
         self._send_next_packet(node_id, current_cycle)
 
+    def traffic_report(self) -> dict[str, int]:
+        """Chunk flits the GPUs inject, next to what the ring algorithm would inject for the same data."""
+        chunk_flits = self.num_nodes * self.data_size * self.chunk_size_flits
+        ring_flits = 2 * (self.num_nodes - 1) * chunk_flits
+        return {'host_flits_sent': chunk_flits if self.in_network else ring_flits, 'ring_flits': ring_flits}
+
     def _send_next_packet(self, node_id: int, current_cycle: int):
         state = self.node_states[node_id]
         if state['phase'] == 'IDLE':
@@ -67,4 +102,97 @@ class AllReduceWorkload:
             packet_size_flits=self.chunk_size_flits,
             current_cycle=current_cycle,
             transaction_id=(node_id << 20) | (state['chunk_idx'] << 12) | (state['phase'] == 'ALL_GATHER') << 8 | state['step']
-        )
\ No newline at end of file
+        )
+
+
+class RequestResponseWorkload:
+    """Closed-loop reads: short READ requests, data RESPONSEs after a service delay, at most
+    `max_outstanding_requests` reads in flight per node (its MSHRs)."""
+
+    def __init__(self, config: dict, tracker, nodes: list[Node]):
+        self.config = config
+        self.tracker = tracker
+        self.nodes = nodes
+        self.num_nodes = len(nodes)
+        workload_config = config.get('workload', {})
+        self.request_rate = config.get('injection_rate', 0.0)
+        self.request_size_flits = workload_config.get('request_size_flits', 1)
+        self.response_size_flits = workload_config.get('response_size_flits', 8)
+        self.service_delay = workload_config.get('service_delay_cycles', 10)
+        self.max_outstanding = workload_config.get('max_outstanding_requests', 4)
+        # Requests go to a random memory node if any are listed, otherwise to a random other node.
+        self.memory_nodes = list(workload_config.get('memory_nodes', []))
+        self.flit_bytes = config.get('flit_width_bits', 128) // 8
+
+        self.outstanding = [0] * self.num_nodes
+        self.issue_cycles: dict[int, int] = {}
+        # Responses waiting out the service delay, in ready order: (ready cycle, server, requester, transaction id).
+        self.service_queue: collections.deque[tuple[int, int, int, int]] = collections.deque()
+        self.next_transaction_id = 0
+        self.start_cycle = 0
+        self.requests_issued = 0
+        self.requests_blocked = 0
+        self.response_flits_received = 0
+        self.round_trip_latencies: list[int] = []
+
+    def initialize(self, start_cycle: int):
+        print(f"[{start_cycle}] WORKLOAD: Starting closed-loop request/response traffic, "
+              f"{self.max_outstanding} outstanding requests per node.")
+        self.start_cycle = start_cycle
+
+    def is_complete(self) -> bool:
+        return False
+
+    def _destination(self, node_id: int) -> int:
+        if self.memory_nodes:
+            dest_id = random.choice(self.memory_nodes)
+            if dest_id != node_id or len(self.memory_nodes) == 1: return dest_id
+            return random.choice([m for m in self.memory_nodes if m != node_id])
+        dest_id = random.randrange(self.num_nodes - 1)
+        return dest_id + 1 if dest_id >= node_id else dest_id
+
+    def process_cycle(self, current_cycle: int):
+        queue = self.service_queue
+        while queue and queue[0][0] <= current_cycle:
+            _, server, requester, transaction_id = queue.popleft()
+            self.nodes[server].inject_workload_packet(requester, self.response_size_flits, current_cycle,
+                                                      transaction_id, PacketType.RESPONSE)
+        for node in self.nodes:
+            if random.random() >= self.request_rate: continue
+            node_id = node.node_id
+            if self.outstanding[node_id] >= self.max_outstanding:
+                self.requests_blocked += 1
+                continue
+            dest_id = self._destination(node_id)
+            if dest_id == node_id: continue
+            transaction_id = self.next_transaction_id
+            self.next_transaction_id += 1
+            self.outstanding[node_id] += 1
+            self.issue_cycles[transaction_id] = current_cycle
+            self.requests_issued += 1
+            node.inject_workload_packet(dest_id, self.request_size_flits, current_cycle, transaction_id, PacketType.READ)
+
+    def on_packet_received(self, node_id: int, src_id: int, current_cycle: int,
+                           packet_type: PacketType = PacketType.WRITE, transaction_id: int = 0):
+        if packet_type is PacketType.READ:
+            self.service_queue.append((current_cycle + self.service_delay, node_id, src_id, transaction_id))
+        elif packet_type is PacketType.RESPONSE:
+            self.outstanding[node_id] -= 1
+            self.round_trip_latencies.append(current_cycle - self.issue_cycles.pop(transaction_id))
+            self.response_flits_received += self.response_size_flits
+
+    def average_round_trip(self) -> float:
+        if not self.round_trip_latencies: return 0.0
+        return sum(self.round_trip_latencies) / len(self.round_trip_latencies)
+
+    def report(self, current_cycle: int) -> dict:
+        cycles = max(current_cycle - self.start_cycle, 1)
+        flits_per_cycle = self.response_flits_received / cycles
+        return {
+            'requests_issued': self.requests_issued,
+            'responses_received': len(self.round_trip_latencies),
+            'requests_blocked': self.requests_blocked,
+            'avg_round_trip': self.average_round_trip(),
+            'bandwidth_flits_per_cycle': flits_per_cycle,
+            'bandwidth_bytes_per_cycle_per_node': flits_per_cycle * self.flit_bytes / self.num_nodes,
+        }
@@ -0,0 +1,55 @@
+import contextlib
+import io
+import random
+import warnings
+from pathlib import Path
+
+import pytest
+import yaml
+
+from noc.packet import FlitType
+from noc.simulator import Simulator
+
+CONFIG_PATH = Path(__file__).resolve().parent.parent / 'config.yaml'
+
+
+def run_saturated(topology: str, num_vcs: int, seed: int, cycles: int, drain_cycles: int = 5000):
+    with open(CONFIG_PATH) as f:
+        config = yaml.safe_load(f)
+    config.update(architecture='monolithic', topology=topology, num_gpus=64, traffic_pattern='uniform_random',
+                  injection_rate=0.6, routing_algo='adaptive', num_virtual_channels=num_vcs)
+    config['watchdog'] = {'enabled': True, 'check_interval': 64, 'stall_cycles': 500}
+    config['packet_records'] = {'enabled': False}
+    random.seed(seed)
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        simulator = Simulator(config)
+        simulator.run(cycles)
+        # Stop generating and drop the packets that have not started injecting, then drain the network.
+        dropped = 0
+        for node in simulator.nodes:
+            node.injection_rate = 0.0
+            queue = node.injection_queue
+            keep = next((i for i, flit in enumerate(queue)
+                         if flit.flit_type is FlitType.HEAD or flit.flit_type is FlitType.HEAD_TAIL), len(queue))
+            dropped += sum(flit.flit_type is FlitType.HEAD or flit.flit_type is FlitType.HEAD_TAIL
+                           for flit in list(queue)[keep:])
+            while len(queue) > keep: queue.pop()
+        for _ in range(drain_cycles // 100):
+            if not simulator.primary_network.active_mask and not any(node.injection_queue for node in simulator.nodes):
+                break
+            simulator.run(100)
+    return simulator, dropped
+
+
+# Saturated uniform traffic under Duato routing, the `adaptive` default on mesh and torus; these seeds
+# deadlocked while output VCs were reallocated before the downstream buffer had drained.
+@pytest.mark.parametrize('topology, num_vcs, seed', [('mesh', 2, 2), ('mesh', 4, 2), ('torus', 3, 1)])
+def test_duato_saturation_drains(topology, num_vcs, seed):
+    simulator, dropped = run_saturated(topology, num_vcs, seed, 3500)
+    network = simulator.primary_network
+    assert not any(router.is_active() for router in network.router_list)
+    assert not any(network.in_flight.values())
+    sent = sum(node.packets_sent for node in simulator.nodes)
+    received = sum(node.packets_received for node in simulator.nodes)
+    assert received == sent - dropped > 0
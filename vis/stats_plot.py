@@ -5,10 +5,15 @@ import matplotlib.pyplot as plt
 import sys
 sys.path.append('..')
 from noc.simulator import Simulator
+from noc.watchdog import NetworkStallError
 
 def run_single_experiment(config: dict) -> float:
     simulator = Simulator(config=config)
-    simulator.run(num_cycles=config['simulation_cycles'])
+    try:
+        simulator.run(num_cycles=config['simulation_cycles'])
+    except NetworkStallError as e:
+        print(f"  Injection Rate: {config['injection_rate']:.3f} FAILED, run aborted by the watchdog:\n{e}")
+        return float('nan')
     tracker = simulator.tracker
     avg_latency = tracker.calculate_average_latency()
     